@@ -1,10 +1,19 @@
+import time
 from typing import AsyncGenerator
+
+from fastapi import Request, Response
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.backend.db import async_session_maker
+from app.backend.db import async_session_maker, read_session_maker, primary_read_session_maker
+from app.backend.settings import db_settings
+
 
+# Cookie с моментом, до которого запросы чтения клиента идут на основную базу
+PRIMARY_COOKIE = 'db_primary_until'
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+
+async def get_db(response: Response) -> AsyncGenerator[AsyncSession, None]:
     """
         Асинхронный генератор, предоставляющий сессию подключения к базе данных.
 
@@ -15,5 +24,50 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         """
     # Контекстный менеджер создаёт асинхронную сессию и автоматически её закрывает после использования
     async with async_session_maker() as session:
+        if db_settings.replica_dsn and db_settings.read_your_writes > 0:
+            # После успешной записи клиент какое-то время читает с основной базы
+            @event.listens_for(session.sync_session, 'after_commit')
+            def remember_write(_):
+                response.set_cookie(
+                    PRIMARY_COOKIE,
+                    str(time.time() + db_settings.read_your_writes),
+                    max_age=int(db_settings.read_your_writes) + 1,
+                    httponly=True,
+                    samesite='lax'
+                )
         # Возвращает сессию наружу — вызывающий код может выполнять запросы к БД
         yield session
+
+
+def _recent_write(request: Request) -> bool:
+    if not db_settings.replica_dsn:
+        return False
+    until = request.cookies.get(PRIMARY_COOKIE)
+    if until is None:
+        return False
+    try:
+        return float(until) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для обработчиков, которые только читают (каталог, отзывы).
+    Запросы идут на реплику, кроме клиентов, недавно выполнивших запись
+    (cookie PRIMARY_COOKIE): они читают с основной базы и видят свои изменения.
+    """
+    session_maker = async_session_maker if _recent_write(request) else read_session_maker
+    async with session_maker() as session:
+        yield session
+
+
+async def get_primary_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия только для чтения для обработчиков, заполняющих общий кэш ответов.
+    Данные читаются без отставания реплики: иначе после инвалидации в кэш
+    на CACHE_TTL попал бы старый ответ — в том числе для клиентов,
+    которые только что сами записали изменения.
+    """
+    async with primary_read_session_maker() as session:
+        yield session
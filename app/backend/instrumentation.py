@@ -0,0 +1,137 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.backend.settings import db_settings
+
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER = re.compile(r'\$\d+|%\(\w+\)s|(?<!:):\w+|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    """
+    Приводит SQL к «форме» без значений: литералы и параметры заменяются на ?,
+    списки IN (?, ?, ...) сворачиваются, пробелы схлопываются.
+    """
+    statement = _STRING.sub('?', statement)
+    statement = _PARAMETER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _LIST.sub('(?, ...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class QueryStats:
+    """
+    SQL-запросы одного HTTP-запроса: количество, суммарное время и (если включено
+    обнаружение N+1) сколько раз выполнялся каждый текст запроса.
+    """
+
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] | None = Counter() if db_settings.detect_n_plus_one else None
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Формы запросов, выполненные больше threshold раз.
+        """
+        if not self.statements:
+            return []
+        shapes = Counter()
+        for statement, count in self.statements.items():
+            shapes[normalize_sql(statement)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count > threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar('query_stats', default=None)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def instrument(engine: AsyncEngine) -> None:
+    """
+    Подключает к движку учёт SQL-запросов: время каждого запроса добавляется
+    в статистику текущего HTTP-запроса, медленные запросы пишутся в лог.
+    """
+    slow_seconds = db_settings.slow_query_ms / 1000
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Время старта хранится в контексте выполнения: при ошибке запроса он
+        # просто отбрасывается, и на соединении ничего не накапливается
+        if context is not None:
+            context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, '_query_started_at', None)
+        if started_at is None:
+            return
+        elapsed = time.perf_counter() - started_at
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            if stats.statements is not None:
+                stats.statements[statement] += 1
+        if elapsed >= slow_seconds:
+            sql = normalize_sql(statement)
+            logger.warning(
+                'Slow query %.1f ms: %s', elapsed * 1000, sql,
+                extra={'duration_ms': round(elapsed * 1000, 1), 'sql': sql, 'executemany': executemany}
+            )
+
+
+class QueryTimingMiddleware:
+    """
+    ASGI-middleware: собирает статистику SQL за время обработки запроса и
+    добавляет её в заголовок Server-Timing (видно во вкладке Network браузера).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).append('Server-Timing', stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            for sql, count in stats.repeated(db_settings.n_plus_one_threshold):
+                logger.warning(
+                    'Possible N+1: %d identical queries in %s %s: %s', count, scope['method'], scope['path'], sql,
+                    extra={'count': count, 'sql': sql, 'method': scope['method'], 'path': scope['path']}
+                )
@@ -0,0 +1,67 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """
+    Счётчики пула соединений: сколько запрос ждал соединение (включая открытие
+    нового) и сколько держал его до возврата в пул.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hold_seconds_total = 0.0
+        self.hold_seconds_max = 0.0
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений для асинхронного движка, который учитывает время ожидания
+    и удержания соединений. По этим данным подбирается pool_size: если ожидание
+    растёт, а удержание короткое — пула не хватает; если удержание длинное —
+    соединения держат обработчики.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        checked_out_at = time.perf_counter()
+        waited = checked_out_at - started_at
+        self.stats.checkouts += 1
+        self.stats.wait_seconds_total += waited
+        self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+        connection.info['checked_out_at'] = checked_out_at
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        checked_out_at = record.info.pop('checked_out_at', None)
+        if checked_out_at is not None:
+            held = time.perf_counter() - checked_out_at
+            self.stats.hold_seconds_total += held
+            self.stats.hold_seconds_max = max(self.stats.hold_seconds_max, held)
+        super()._do_return_conn(record)
+
+    def snapshot(self) -> dict:
+        """
+        Текущее состояние пула и накопленные счётчики.
+        """
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            # overflow() отрицателен, пока пул не заполнен (-pool_size у пустого пула)
+            'overflow': max(0, self.overflow()),
+            **vars(self.stats),
+        }
@@ -0,0 +1,67 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.backend.settings import DatabaseSettings
+from app.backend.pool import MeteredPool
+
+
+def _apply_pragmas(dbapi_connection, settings: DatabaseSettings, writer: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    # WAL: читатели не блокируют писателя и наоборот
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # В режиме WAL NORMAL не теряет целостность, fsync только на контрольных точках
+    cursor.execute(f'PRAGMA synchronous={settings.sqlite_synchronous}')
+    cursor.execute(f'PRAGMA cache_size={settings.sqlite_cache_size}')
+    cursor.execute(f'PRAGMA mmap_size={settings.sqlite_mmap_size}')
+    cursor.execute(f'PRAGMA busy_timeout={settings.sqlite_busy_timeout}')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    if not writer:
+        cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+def configure_sqlite(engine: AsyncEngine, settings: DatabaseSettings, writer: bool) -> AsyncEngine:
+    """
+    Настраивает соединения SQLite при открытии.
+
+    Писатель начинает транзакции с BEGIN IMMEDIATE: блокировка на запись берётся
+    сразу, и параллельные процессы ждут busy_timeout, а не падают при попытке
+    повысить уровень блокировки посреди транзакции. Соединения читателей
+    переводятся в query_only.
+    """
+    @event.listens_for(engine.sync_engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # Отключаем собственное управление транзакциями драйвера, BEGIN выдаём сами
+        dbapi_connection.isolation_level = None
+        _apply_pragmas(dbapi_connection, settings, writer)
+
+    @event.listens_for(engine.sync_engine, 'begin')
+    def on_begin(connection):
+        connection.exec_driver_sql('BEGIN IMMEDIATE' if writer else 'BEGIN')
+
+    return engine
+
+
+def create_sqlite_engines(settings: DatabaseSettings) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Возвращает движок-писатель (одно соединение) и движок для чтения
+    (несколько соединений к тому же файлу или к реплике).
+    """
+    writer = configure_sqlite(
+        create_async_engine(settings.url, poolclass=MeteredPool, **settings.engine_options()),
+        settings,
+        writer=True
+    )
+    reader = configure_sqlite(
+        create_async_engine(
+            settings.replica_url or settings.url,
+            poolclass=MeteredPool,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            echo=settings.echo
+        ),
+        settings,
+        writer=False
+    )
+    return writer, reader
@@ -0,0 +1,220 @@
+import codecs
+import csv
+import json
+import secrets
+from typing import AsyncIterator, Literal
+
+from pydantic import ValidationError
+from slugify import slugify
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.category import Category
+from app.models.products import Product
+from app.schemas import CreateProduct
+
+
+# Сколько строк вставляется одним многострочным INSERT и одной транзакцией
+BATCH_SIZE = 1000
+
+# Сколько ошибок по строкам попадает в ответ (остальные только считаются)
+MAX_REPORTED_ERRORS = 1000
+
+# Максимальный размер одной CSV-записи в символах (меньше csv.field_size_limit()).
+# Запись, которая так и не закрыла кавычку, отбрасывается по достижении лимита.
+MAX_RECORD_SIZE = 64 * 1024
+
+ImportFormat = Literal['csv', 'ndjson']
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Превращает поток байтов в поток строк, не держа в памяти больше одного куска.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    tail = ''
+    async for chunk in chunks:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split('\n')
+        for line in lines:
+            yield line
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _parse_csv(text: str) -> list[str] | str:
+    try:
+        return next(csv.reader([text]))
+    except csv.Error as exc:
+        return f'Invalid CSV: {exc}'
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[list[str] | str]:
+    """
+    Собирает CSV-записи из строк. Запись может занимать несколько строк,
+    если перенос стоит внутри кавычек: пока число кавычек нечётное, запись не закончена.
+    Чётность считается по каждой новой строке, а не по всей накопленной записи.
+
+    Вместо записи может прийти текст ошибки: запись длиннее MAX_RECORD_SIZE
+    (обычно из-за незакрытой кавычки) отбрасывается, и разбор продолжается
+    со следующей строки.
+    """
+    pending = []
+    size = 0
+    quoted = False
+    async for line in lines:
+        pending.append(line)
+        size += len(line) + 1
+        if line.count('"') % 2:
+            quoted = not quoted
+        if size > MAX_RECORD_SIZE:
+            pending, size, quoted = [], 0, False
+            yield f'Record is longer than {MAX_RECORD_SIZE} characters (unterminated quote?)'
+            continue
+        if quoted:
+            continue
+        text = '\n'.join(pending)
+        pending, size = [], 0
+        if text.strip():
+            yield _parse_csv(text)
+    if pending:
+        yield 'Unterminated quoted field'
+
+
+async def iter_rows(chunks: AsyncIterator[bytes], fmt: ImportFormat) -> AsyncIterator[tuple[int, dict | str]]:
+    """
+    Отдаёт (номер строки, словарь полей) или (номер строки, текст ошибки разбора).
+    Для CSV первая строка — заголовок с именами полей CreateProduct.
+    """
+    lines = iter_lines(chunks)
+    if fmt == 'ndjson':
+        number = 0
+        async for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, f'Invalid JSON: {exc}'
+                continue
+            yield number, row if isinstance(row, dict) else 'Row must be a JSON object'
+    else:
+        header = None
+        number = 0
+        async for record in iter_csv_records(lines):
+            if isinstance(record, str):
+                # Ошибка в заголовке получает номер 0
+                if header is not None:
+                    number += 1
+                yield number, record
+                continue
+            if header is None:
+                header = [name.strip() for name in record]
+                continue
+            number += 1
+            if len(record) != len(header):
+                yield number, f'Expected {len(header)} columns, got {len(record)}'
+                continue
+            yield number, dict(zip(header, record))
+
+
+class BulkImport:
+    """
+    Потоковый импорт товаров: строки проверяются по CreateProduct и пишутся
+    пачками по BATCH_SIZE. На пачку приходится не больше трёх запросов:
+    проверка новых категорий, поиск занятых slug и многострочный INSERT.
+    """
+
+    def __init__(self, db: AsyncSession, supplier_id: int):
+        self.db = db
+        self.supplier_id = supplier_id
+        self.created = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self.category_ids: set[int] = set()
+        self._known_categories: dict[int, bool] = {}
+        self._batch: list[tuple[int, CreateProduct]] = []
+
+    def _error(self, number: int, error) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'error': error})
+
+    async def add(self, number: int, row: dict | str) -> None:
+        if isinstance(row, str):
+            self._error(number, row)
+            return
+        try:
+            product = CreateProduct.model_validate(row)
+        except ValidationError as exc:
+            self._error(number, exc.errors(include_url=False, include_input=False, include_context=False))
+            return
+        self._batch.append((number, product))
+        if len(self._batch) >= BATCH_SIZE:
+            await self.flush()
+
+    async def _check_categories(self, batch: list[tuple[int, CreateProduct]]) -> None:
+        unknown = {product.category for _, product in batch} - self._known_categories.keys()
+        if unknown:
+            found = set(await self.db.scalars(select(Category.id).where(Category.id.in_(unknown))))
+            for category_id in unknown:
+                self._known_categories[category_id] = category_id in found
+
+    async def _unique_slugs(self, batch: list[tuple[int, CreateProduct]]) -> list[str]:
+        slugs = [slugify(product.name) for _, product in batch]
+        taken = set(await self.db.scalars(select(Product.slug).where(Product.slug.in_(set(slugs)))))
+        result = []
+        for slug in slugs:
+            # Занятый slug получает случайный суффикс — без дополнительных запросов к базе
+            while slug in taken:
+                slug = f'{slug}-{secrets.token_hex(3)}'
+            taken.add(slug)
+            result.append(slug)
+        return result
+
+    async def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        await self._check_categories(batch)
+        valid = []
+        for number, product in batch:
+            if self._known_categories[product.category]:
+                valid.append((number, product))
+            else:
+                self._error(number, 'There is no category found')
+        if not valid:
+            # Проверка категорий открыла транзакцию — возвращаем соединение в пул,
+            # пока читается остаток загрузки
+            await self.db.rollback()
+            return
+
+        slugs = await self._unique_slugs(valid)
+        values = [
+            {
+                'name': product.name,
+                'slug': slug,
+                'description': product.description,
+                'price': product.price,
+                'image_url': product.image_url,
+                'stock': product.stock,
+                'category_id': product.category,
+                'supplier_id': self.supplier_id,
+                'rating': 0.0,
+            }
+            for (_, product), slug in zip(valid, slugs)
+        ]
+        try:
+            await self.db.execute(insert(Product), values)
+            await self.db.commit()
+        except IntegrityError:
+            # Кто-то параллельно занял slug — пачка откатывается целиком
+            await self.db.rollback()
+            for number, _ in valid:
+                self._error(number, 'Conflicts with an existing product')
+            return
+        self.created += len(valid)
+        self.category_ids.update(product.category for _, product in valid)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Protocol
+
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+
+from app.category_tree import category_tree
+
+
+# Время жизни записи и объём памяти под кэш ответов в одном процессе
+CACHE_TTL = 60.0
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Если задан — ответы кэшируются в общем для всех воркеров Redis
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+
+class CacheBackend(Protocol):
+    async def get(self, key: str) -> tuple[bytes, str] | None: ...
+
+    async def set(self, key: str, body: bytes, etag: str, tags: Iterable[str], ttl: float) -> None: ...
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None: ...
+
+
+class MemoryCacheBackend:
+    """
+    LRU-кэш в памяти процесса с TTL и ограничением суммарного размера в байтах.
+    Работает только из event loop, поэтому блокировки не нужны.
+    """
+
+    # Примерные накладные расходы на одну запись (ключ, кортеж, словари тегов)
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[bytes, str, float, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+
+    def _entry_size(self, key: str, body: bytes) -> int:
+        return len(key) + len(body) + self.ENTRY_OVERHEAD
+
+    def _remove(self, key: str) -> None:
+        body, _, _, tags = self._entries.pop(key)
+        self.size -= self._entry_size(key, body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> tuple[bytes, str] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        body, etag, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return body, etag
+
+    async def set(self, key: str, body: bytes, etag: str, tags: Iterable[str], ttl: float) -> None:
+        size = self._entry_size(key, body)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (body, etag, time.monotonic() + ttl, tags)
+        self.size += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        # Вытесняем давно не использованные записи, пока не уложимся в лимит
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+
+class RedisCacheBackend:
+    """
+    Общий кэш для нескольких воркеров. Для каждого тега хранится множество ключей,
+    чтобы инвалидация удаляла ровно затронутые записи.
+    Требует пакет redis (не входит в requirements.txt).
+    """
+
+    def __init__(self, url: str, prefix: str = 'response-cache:'):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> tuple[bytes, str] | None:
+        value = await self.redis.get(self.prefix + key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b'\n')
+        return body, etag.decode()
+
+    async def set(self, key: str, body: bytes, etag: str, tags: Iterable[str], ttl: float) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, etag.encode() + b'\n' + body, px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(f'{self.prefix}tag:{tag}', key)
+                pipe.pexpire(f'{self.prefix}tag:{tag}', int(ttl * 2000))
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = await self.redis.smembers(tag_key)
+            await self.redis.delete(tag_key, *(self.prefix + key.decode() for key in keys))
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Кэш готовых JSON-ответов для часто читаемых эндпоинтов каталога.
+
+    Ответ сериализуется один раз, хранится вместе со строгим ETag и отдаётся
+    как есть; при совпадении If-None-Match возвращается 304 без тела.
+    Записи помечаются тегами, обработчики записи сбрасывают кэш по тегам.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Увеличивается при каждой инвалидации: ответ, начатый до неё,
+        # мог прочитать старые данные, и его нельзя класть в кэш
+        self._generation = 0
+
+    async def respond(
+            self,
+            request: Request,
+            key: str,
+            tags: Iterable[str],
+            producer: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            body, etag = cached
+        else:
+            self.misses += 1
+            generation = self._generation
+            data = await producer()
+            body = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(',', ':')).encode()
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if generation == self._generation:
+                await self.backend.set(key, body, etag, tags, self.ttl)
+
+        if _matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+    async def invalidate(self, *tags: str) -> None:
+        self._generation += 1
+        await self.backend.invalidate_tags(tags)
+
+
+def _key_value(value) -> str:
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    if isinstance(value, (list, tuple)):
+        return ','.join(map(str, value))
+    return str(value)
+
+
+def request_key(prefix: str, **params) -> str:
+    """
+    Ключ кэша из уже проверенных параметров эндпоинта (в отсортированном виде).
+    Посторонние query-параметры в ключ не попадают и не плодят новые записи.
+    """
+    query = '&'.join(
+        f'{name}={_key_value(value)}' for name, value in sorted(params.items()) if value is not None
+    )
+    return f'{prefix}?{query}'
+
+
+async def invalidate_product(slugs: Iterable[str | None], category_ids: Iterable[int | None]) -> None:
+    """
+    Сбрасывает карточки товаров и списки товаров по категориям, в которые они входят
+    (вместе со всеми родительскими категориями — их списки тоже включают товар).
+    """
+    tags = {f'product:{slug}' for slug in slugs if slug}
+    for category_id in category_ids:
+        if category_id is not None:
+            for node in await category_tree.ancestors(category_id):
+                tags.add(f"category:{node['slug']}")
+    await response_cache.invalidate(*tags)
+
+
+response_cache = ResponseCache(
+    RedisCacheBackend(CACHE_REDIS_URL) if CACHE_REDIS_URL else MemoryCacheBackend()
+)
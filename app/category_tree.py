@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.backend.db import primary_read_session_maker
+from app.models.category import Category
+
+
+class CategoryTree:
+    """
+    Дерево категорий в памяти процесса.
+
+    Строится одним запросом ко всей таблице categories и отдаёт для любого slug
+    полный набор id категории и всех её потомков (на любую глубину).
+    Сбрасывается обработчиками записи в app/routers/category.py; ttl ограничивает
+    время, в течение которого другие воркеры могут видеть устаревшее дерево.
+
+    Дерево читается в собственной короткой сессии, а не в сессии запроса:
+    обращение после commit не должно снова занимать соединение запроса
+    до конца обработки.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession], ttl: float = 300.0):
+        self.session_maker = session_maker
+        self.ttl = ttl
+        self._lock = asyncio.Lock()
+        self._loaded_at: float | None = None
+        self._by_slug: dict[str, int] = {}
+        self._nodes: dict[int, dict] = {}
+        self._children: dict[int, list[int]] = {}
+        self._descendants: dict[int, frozenset[int]] = {}
+
+    def invalidate(self) -> None:
+        """
+        Помечает дерево устаревшим; оно будет перестроено при следующем обращении.
+        """
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+        async with self._lock:
+            # Пока ждали блокировку, дерево мог построить другой запрос
+            if self._is_fresh():
+                return
+            async with self.session_maker() as session:
+                rows = await session.execute(select(
+                    Category.id, Category.name, Category.slug, Category.parent_id, Category.is_active
+                ))
+                nodes = {row.id: row._asdict() for row in rows}
+            children: dict[int, list[int]] = {}
+            for node in nodes.values():
+                if node['parent_id'] is not None:
+                    children.setdefault(node['parent_id'], []).append(node['id'])
+
+            self._nodes = nodes
+            self._children = children
+            self._by_slug = {node['slug']: node['id'] for node in nodes.values() if node['slug']}
+            self._descendants = {}
+            self._loaded_at = time.monotonic()
+
+    def _collect(self, category_id: int) -> frozenset[int]:
+        cached = self._descendants.get(category_id)
+        if cached is not None:
+            return cached
+        # Обход в ширину; visited защищает от циклов в parent_id
+        visited = {category_id}
+        queue = [category_id]
+        while queue:
+            for child in self._children.get(queue.pop(), ()):
+                if child not in visited:
+                    visited.add(child)
+                    queue.append(child)
+        result = frozenset(visited)
+        self._descendants[category_id] = result
+        return result
+
+    async def descendant_ids(self, slug: str) -> frozenset[int] | None:
+        """
+        Возвращает id категории и всех её потомков или None, если slug не найден.
+        """
+        await self._ensure_loaded()
+        category_id = self._by_slug.get(slug)
+        if category_id is None:
+            return None
+        return self._collect(category_id)
+
+    async def ancestors(self, category_id: int) -> list[dict]:
+        """
+        Возвращает цепочку категорий от корня до категории category_id включительно.
+        """
+        await self._ensure_loaded()
+        chain = []
+        seen = set()
+        node = self._nodes.get(category_id)
+        while node is not None and node['id'] not in seen:
+            seen.add(node['id'])
+            chain.append(node)
+            node = self._nodes.get(node['parent_id'])
+        chain.reverse()
+        return chain
+
+
+# Реплику не используем — после изменения категорий она может отставать
+category_tree = CategoryTree(primary_read_session_maker)
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Literal
+
+from sqlalchemy import select
+
+from app.backend.db import read_session_maker
+from app.models.products import Product, LISTED
+
+
+# Сколько строк за раз получает серверный курсор и кодируется в один кусок ответа
+EXPORT_BATCH = 2000
+
+ExportFormat = Literal['ndjson', 'csv']
+
+EXPORT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.slug,
+    Product.description,
+    Product.price,
+    Product.image_url,
+    Product.stock,
+    Product.rating,
+    Product.category_id,
+    Product.supplier_id,
+)
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _encode_ndjson(rows) -> bytes:
+    return ''.join(
+        json.dumps(row._asdict(), ensure_ascii=False, separators=(',', ':')) + '\n'
+        for row in rows
+    ).encode()
+
+
+def _encode_csv(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(column.key for column in EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def export_products(fmt: ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Отдаёт каталог кусками по EXPORT_BATCH строк.
+
+    Сессия открывается внутри генератора (а не через get_db), потому что
+    StreamingResponse читает его уже после выхода из обработчика. Выбираются
+    только колонки, без ORM-объектов, а строки приходят из серверного курсора,
+    поэтому в памяти одновременно находится не больше одной пачки.
+    """
+    if fmt == 'csv':
+        yield _encode_csv((), header=True)
+    async with read_session_maker() as session:
+        result = await session.stream(
+            select(*EXPORT_COLUMNS)
+            .where(*LISTED)
+            .order_by(Product.id)
+            .execution_options(yield_per=EXPORT_BATCH)
+        )
+        async for rows in result.partitions():
+            yield _encode_ndjson(rows) if fmt == 'ndjson' else _encode_csv(rows)
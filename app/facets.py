@@ -0,0 +1,82 @@
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.products import Product, LISTED
+
+
+# Границы ценовых диапазонов: [0, 500), [500, 1000), ..., [50000, ∞)
+PRICE_BUCKETS = (0, 500, 1000, 5000, 10000, 50000)
+
+# Пороги рейтинга: "от 4 и выше", "от 3 и выше" и т.д.
+RATING_BANDS = (4, 3, 2, 1)
+
+
+def _price_ranges() -> list[tuple[int, int | None]]:
+    uppers = PRICE_BUCKETS[1:] + (None,)
+    return list(zip(PRICE_BUCKETS, uppers))
+
+
+async def product_facets(db: AsyncSession, conditions: list) -> dict:
+    """
+    Считает количество товаров по фасетам для текущего фильтра.
+
+    Все фасеты считаются за один проход одним запросом: группировка по
+    (категория, продавец) даёт счётчики для этих двух фасетов, а ценовые
+    диапазоны и рейтинг считаются условными агрегатами COUNT(*) FILTER (WHERE ...)
+    в тех же группах и суммируются уже в Python.
+    """
+    price_ranges = _price_ranges()
+    price_counts = [
+        func.count().filter(
+            and_(Product.price >= lower, Product.price < upper) if upper is not None
+            else Product.price >= lower
+        )
+        for lower, upper in price_ranges
+    ]
+    rating_counts = [func.count().filter(Product.rating >= band) for band in RATING_BANDS]
+
+    rows = await db.execute(
+        select(
+            Product.category_id,
+            Product.supplier_id,
+            func.count(),
+            *price_counts,
+            *rating_counts
+        )
+        .where(*LISTED, *conditions)
+        .group_by(Product.category_id, Product.supplier_id)
+    )
+
+    total = 0
+    categories: dict[int, int] = {}
+    suppliers: dict[int | None, int] = {}
+    prices = [0] * len(price_ranges)
+    ratings = [0] * len(RATING_BANDS)
+    for category_id, supplier_id, count, *counts in rows:
+        total += count
+        categories[category_id] = categories.get(category_id, 0) + count
+        suppliers[supplier_id] = suppliers.get(supplier_id, 0) + count
+        for i, value in enumerate(counts[:len(prices)]):
+            prices[i] += value
+        for i, value in enumerate(counts[len(prices):]):
+            ratings[i] += value
+
+    return {
+        'total': total,
+        'price': [
+            {'min': lower, 'max': upper, 'count': count}
+            for (lower, upper), count in zip(price_ranges, prices)
+        ],
+        'rating': [
+            {'min': band, 'count': count}
+            for band, count in zip(RATING_BANDS, ratings)
+        ],
+        'category': [
+            {'id': category_id, 'count': count}
+            for category_id, count in sorted(categories.items())
+        ],
+        'supplier': [
+            {'id': supplier_id, 'count': count}
+            for supplier_id, count in sorted(suppliers.items(), key=lambda item: (item[0] is None, item[0]))
+        ],
+    }
@@ -0,0 +1,61 @@
+from typing import Annotated, Iterable
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import inspect
+
+from app.models.products import Product
+from app.models.reviews import Reviews
+from app.ratings import GRADES, grade_column
+
+
+def _columns(model) -> dict:
+    return {attr.key: getattr(model, attr.key) for attr in inspect(model).column_attrs}
+
+
+# Служебные счётчики, из которых пересчитывается рейтинг (app/ratings.py), наружу не отдаются
+PRODUCT_INTERNAL = {'grade_sum', *(grade_column(grade).key for grade in GRADES)}
+
+# Поля, которые клиент может запросить через fields=
+PRODUCT_FIELDS = {key: column for key, column in _columns(Product).items() if key not in PRODUCT_INTERNAL}
+REVIEW_FIELDS = _columns(Reviews)
+
+# Поля товара без параметра fields=; число отзывов отдаётся только по запросу
+PRODUCT_DEFAULT_FIELDS = [key for key in PRODUCT_FIELDS if key != 'review_count']
+
+# Query-параметр для выбора полей: "fields=id,name,price"
+Fields = Annotated[
+    str | None,
+    Query(description='Список возвращаемых полей через запятую', examples=['id,name,slug,price,image_url,rating'])
+]
+
+
+def resolve_fields(fields: str | None, available: dict, default: Iterable[str] | None = None) -> list[str]:
+    """
+    Разбирает параметр fields. Без параметра возвращаются поля default
+    (по умолчанию — все доступные). Неизвестное поле — ошибка 400.
+    """
+    if fields is None:
+        return list(available if default is None else default)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Unknown fields: {", ".join(unknown)}' if unknown else 'No fields requested'
+        )
+    return names
+
+
+def select_columns(available: dict, names: Iterable[str], *required: str) -> list:
+    """
+    Колонки для SELECT: запрошенные поля плюс те, что нужны самому запросу
+    (например, ключи сортировки для курсора).
+    """
+    return [available[name] for name in dict.fromkeys([*names, *required])]
+
+
+def project(row, names: list[str]) -> dict:
+    """
+    Строка результата в виде словаря только с запрошенными полями.
+    """
+    return {name: getattr(row, name) for name in names}
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+
+# Стоимость bcrypt (2^rounds итераций). Хеши с другой стоимостью
+# прозрачно перехешируются при следующем успешном входе.
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+
+# Сколько хеширований выполняется одновременно и сколько может ждать очереди.
+# bcrypt отпускает GIL, поэтому потоки реально работают параллельно.
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', '4'))
+HASH_MAX_WAITING = int(os.getenv('HASH_MAX_WAITING', '64'))
+
+
+# Контекст шифрования паролей: указываем использовать алгоритм bcrypt
+# deprecated='auto' означает, что старые схемы считаются устаревшими
+bcrypt_context = CryptContext(
+    schemes=['bcrypt'],     # допустимые алгоритмы
+    deprecated='auto',
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordHasher:
+    """
+    Выполняет хеширование и проверку паролей в отдельном пуле потоков,
+    чтобы ~200 мс работы bcrypt не блокировали event loop.
+
+    Одновременно работает не больше max_workers вызовов; если в очереди уже
+    max_waiting вызовов, новый получает 503 вместо бесконечного ожидания.
+    Время ожидания в очереди накапливается в счётчиках для метрик.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = HASH_WORKERS, max_waiting: int = HASH_MAX_WAITING):
+        self.context = context
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bcrypt')
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self.waiting = 0
+        self.calls = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.work_seconds_total = 0.0
+
+    async def _run(self, func, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Server is busy, try again later',
+                headers={'Retry-After': '1'}
+            )
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            started_at = time.perf_counter()
+            queued = started_at - queued_at
+            self.calls += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            self.work_seconds_total += time.perf_counter() - started_at
+            return result
+        finally:
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str | None) -> tuple[bool, str | None]:
+        """
+        Проверяет пароль. Вторым значением возвращает новый хеш, если сохранённый
+        сделан с устаревшими параметрами (например, другой стоимостью bcrypt).
+        """
+        if not hashed_password:
+            return False, None
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+
+password_hasher = PasswordHasher(bcrypt_context)
@@ -1,8 +1,37 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import Response
 from app.routers import category, products, auth, permission, reviews
+from app.review_writer import review_writer
+from app.revocation import revocations
+from app.backend.instrumentation import QueryTimingMiddleware
+from app.metrics import MetricsMiddleware, metrics_writer, render, CONTENT_TYPE
+from app.backend.db import engine, read_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновая запись отзывов (если включена); при остановке дописываем очередь
+    await review_writer.start()
+    # Отозванные сессии: загрузка при старте и периодическое обновление
+    await revocations.start()
+    # Снимки метрик для сбора со всех воркеров (если задан METRICS_MULTIPROC_DIR)
+    await metrics_writer.start()
+    yield
+    await metrics_writer.stop()
+    await revocations.stop()
+    await review_writer.stop()
+    # Закрываем соединения пулов: у aiosqlite каждое соединение держит
+    # не-daemon поток, без этого процесс не завершится
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 
-app = FastAPI(title="My e-commerce app")
+app = FastAPI(title="My e-commerce app", lifespan=lifespan)
+app.add_middleware(QueryTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -10,6 +39,11 @@ async def welcome() -> dict:
     return {"message": "My e-commerce app"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
 app.include_router(category.router)
 app.include_router(products.router)
 app.include_router(auth.router)
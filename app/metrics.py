@@ -0,0 +1,454 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.backend.db import engine, read_engine
+from app.cache import response_cache
+from app.token_cache import token_cache
+from app.hashing import password_hasher
+from app.throttling import login_throttle
+from app.review_writer import review_writer
+
+
+logger = logging.getLogger(__name__)
+
+# Каталог, куда каждый воркер uvicorn пишет снимок своих метрик. Если задан,
+# /metrics в любом воркере отдаёт сумму по всем процессам.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+# Как часто воркер обновляет свой снимок (сек.)
+METRICS_FLUSH_INTERVAL = 5.0
+# Гауги из снимков старше этого срока не учитываются: воркер, скорее всего, завершён
+METRICS_STALE_AFTER = 3 * METRICS_FLUSH_INTERVAL
+
+# Границы корзин гистограмм (верхние, включительно)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric(ABC):
+    """
+    Метрика с набором меток. Значения для каждого сочетания меток создаются
+    один раз и дальше только изменяются на месте.
+
+    Все изменения выполняются из event loop, поэтому блокировки не нужны.
+    """
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: dict[tuple, object] = {}
+
+    @abstractmethod
+    def _new(self):
+        """
+        Создаёт значение для нового сочетания меток.
+        """
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = self._new()
+        return series
+
+    def samples(self) -> list:
+        """
+        Значения в виде [метки, значение] для снимка и выдачи.
+        """
+        return [[list(labels), series.value()] for labels, series in self._series.items()]
+
+
+class _Value:
+    __slots__ = ('amount',)
+
+    def __init__(self):
+        self.amount = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.amount += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.amount -= amount
+
+    def value(self) -> float:
+        return self.amount
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new(self):
+        return _Value()
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def _new(self):
+        return _Value()
+
+
+class _Buckets:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # Последняя ячейка — значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def value(self) -> dict:
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new(self):
+        return _Buckets(self.buckets)
+
+
+class CallbackMetric:
+    """
+    Метрика, значения которой вычисляются в момент сбора (состояние пула, счётчики кэшей).
+    callback возвращает пары (значения меток, значение).
+    """
+
+    def __init__(self, name: str, documentation: str, type: str, labelnames: Iterable[str], callback: Callable):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> list:
+        return [[list(labels), value] for labels, value in self.callback()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric | CallbackMetric] = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        return {
+            name: {
+                'type': metric.type,
+                'help': metric.documentation,
+                'labels': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.samples(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    'http_requests_total', 'Количество HTTP-запросов', ('method', 'route', 'status')
+))
+REQUEST_DURATION = registry.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса', ('method', 'route'), LATENCY_BUCKETS
+))
+RESPONSE_SIZE = registry.register(Histogram(
+    'http_response_size_bytes', 'Размер тела ответа', ('method', 'route'), SIZE_BUCKETS
+))
+IN_PROGRESS = registry.register(Gauge(
+    'http_requests_in_progress', 'HTTP-запросы в обработке', ('method',)
+))
+
+
+def collector(name: str, documentation: str, type: str, labelnames: Iterable[str] = ()):
+    """
+    Регистрирует функцию как метрику, вычисляемую при сборе.
+    """
+    def decorator(callback: Callable):
+        registry.register(CallbackMetric(name, documentation, type, labelnames, callback))
+        return callback
+    return decorator
+
+
+# Агрегация снимков нескольких процессов
+
+def _merge(snapshots: list[tuple[dict, bool]]) -> dict:
+    """
+    Складывает снимки воркеров: счётчики и гистограммы суммируются,
+    гауги — только из живых воркеров (fresh=True).
+    """
+    merged: dict[str, dict] = {}
+    for snapshot, fresh in snapshots:
+        for name, family in snapshot.items():
+            if family['type'] == 'gauge' and not fresh:
+                continue
+            target = merged.setdefault(name, {**family, 'samples': {}})
+            for labels, value in family['samples']:
+                key = tuple(labels)
+                current = target['samples'].get(key)
+                if family['type'] == 'histogram':
+                    if current is None:
+                        current = target['samples'][key] = {'counts': [0] * len(value['counts']), 'sum': 0.0}
+                    current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                    current['sum'] += value['sum']
+                else:
+                    target['samples'][key] = (current or 0) + value
+    return merged
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f'{pid}.json')
+
+
+def _read_snapshots() -> list[tuple[dict, bool]]:
+    snapshots = []
+    now = time.time()
+    own = _snapshot_path(os.getpid())
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, '*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            # Файл мог быть удалён или ещё дописывается
+            continue
+        snapshots.append((data['metrics'], now - data['time'] < METRICS_STALE_AFTER))
+    return snapshots
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render() -> str:
+    """
+    Метрики в текстовом формате Prometheus. При METRICS_MULTIPROC_DIR —
+    сумма по всем воркерам (текущий берётся из памяти, остальные — из снимков).
+    """
+    snapshots = [(registry.snapshot(), True)]
+    if METRICS_MULTIPROC_DIR:
+        snapshots += _read_snapshots()
+    lines = []
+    for name, family in _merge(snapshots).items():
+        lines.append(f'# HELP {name} {family["help"]}')
+        lines.append(f'# TYPE {name} {family["type"]}')
+        names = family['labels']
+        for labels, value in family['samples'].items():
+            if family['type'] != 'histogram':
+                lines.append(f'{name}{_labels(names, labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*family['buckets'], float('inf')], value['counts']):
+                cumulative += count
+                le = 'le="%s"' % _format_number(bound)
+                lines.append(f'{name}_bucket{_labels(names, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, labels)} {_format_number(value["sum"])}')
+            lines.append(f'{name}_count{_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsWriter:
+    """
+    Периодически сохраняет снимок метрик воркера в METRICS_MULTIPROC_DIR.
+    """
+
+    def __init__(self, interval: float = METRICS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def flush(self) -> None:
+        data = json.dumps({'time': time.time(), 'metrics': registry.snapshot()})
+        path = _snapshot_path(os.getpid())
+        await asyncio.to_thread(self._write, path, data)
+
+    @staticmethod
+    def _write(path: str, data: str) -> None:
+        # Запись через временный файл, чтобы другие воркеры не прочитали половину
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as file:
+            file.write(data)
+        os.replace(tmp, path)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Failed to write metrics snapshot')
+
+    async def start(self) -> None:
+        if METRICS_MULTIPROC_DIR and self._task is None:
+            os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Последний снимок: счётчики завершённого воркера остаются в сумме
+        await self.flush()
+
+
+metrics_writer = MetricsWriter()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: число запросов, время ответа и размер тела по маршрутам.
+    Метка route — шаблон пути (/product/detail/{product_slug}), а не сам путь,
+    чтобы число рядов не росло с числом товаров.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        started_at = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        in_progress = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_progress.dec()
+            route = scope.get('route')
+            path = route.path if route is not None else 'unmatched'
+            REQUESTS.labels(method, path, str(status_code)).inc()
+            REQUEST_DURATION.labels(method, path).observe(time.perf_counter() - started_at)
+            RESPONSE_SIZE.labels(method, path).observe(size)
+
+
+# Метрики, вычисляемые при сборе
+
+def _pools():
+    yield 'primary', engine.pool.snapshot()
+    if read_engine is not engine:
+        yield 'replica', read_engine.pool.snapshot()
+
+
+# Имя метрики, поле MeteredPool.snapshot(), тип, описание
+POOL_METRICS = (
+    ('db_pool_size', 'size', 'gauge', 'Размер пула соединений'),
+    ('db_pool_checked_out', 'checked_out', 'gauge', 'Соединения, выданные из пула'),
+    ('db_pool_overflow', 'overflow', 'gauge', 'Соединения сверх pool_size'),
+    ('db_pool_checkouts_total', 'checkouts', 'counter', 'Выдачи соединений из пула'),
+    ('db_pool_timeouts_total', 'timeouts', 'counter', 'Таймауты ожидания соединения'),
+    ('db_pool_wait_seconds_total', 'wait_seconds_total', 'counter', 'Суммарное ожидание соединения'),
+    ('db_pool_hold_seconds_total', 'hold_seconds_total', 'counter', 'Суммарное удержание соединений'),
+)
+
+def _pool_collector(key: str) -> Callable:
+    return lambda: [((pool,), stats[key]) for pool, stats in _pools()]
+
+
+for _name, _key, _kind, _documentation in POOL_METRICS:
+    collector(_name, _documentation, _kind, ('pool',))(_pool_collector(_key))
+
+
+@collector('cache_requests_total', 'Обращения к кэшам по результату', 'counter', ('cache', 'result'))
+def _cache_requests():
+    return [
+        (('response', 'hit'), response_cache.hits),
+        (('response', 'miss'), response_cache.misses),
+        (('token', 'hit'), token_cache.hits),
+        (('token', 'miss'), token_cache.misses),
+    ]
+
+
+@collector('cache_size', 'Размер кэшей (байты для ответов, записи для токенов)', 'gauge', ('cache',))
+def _cache_size():
+    return [
+        (('response',), getattr(response_cache.backend, 'size', 0)),
+        (('token',), len(token_cache)),
+    ]
+
+
+@collector('password_hash_calls_total', 'Вызовы bcrypt', 'counter')
+def _hash_calls():
+    return [((), password_hasher.calls)]
+
+
+@collector('password_hash_rejected_total', 'Вызовы bcrypt, отклонённые из-за очереди', 'counter')
+def _hash_rejected():
+    return [((), password_hasher.rejected)]
+
+
+@collector('password_hash_queue_seconds_total', 'Суммарное ожидание bcrypt в очереди', 'counter')
+def _hash_queue():
+    return [((), password_hasher.queue_seconds_total)]
+
+
+@collector('password_hash_waiting', 'Вызовы bcrypt в очереди', 'gauge')
+def _hash_waiting():
+    return [((), password_hasher.waiting)]
+
+
+@collector('login_throttled_total', 'Попытки входа, отклонённые ограничением', 'counter')
+def _login_throttled():
+    return [((), login_throttle.rejected)]
+
+
+@collector('reviews_written_total', 'Отзывы, записанные отложенной записью', 'counter', ('result',))
+def _reviews_written():
+    return [(('written',), review_writer.written), (('dropped',), review_writer.dropped)]
+
+
+@collector('review_queue_size', 'Отзывы в очереди отложенной записи', 'gauge')
+def _review_queue():
+    return [((), review_writer.queue.qsize())]
@@ -8,12 +8,19 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 from app.backend.db import Base
+from app.backend.settings import db_settings
 from app.models import category, products, user, reviews
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# Адрес базы берём из тех же настроек, что и приложение (% экранируется для configparser)
+config.set_main_option(
+    'sqlalchemy.url',
+    db_settings.url.render_as_string(hide_password=False).replace('%', '%%')
+)
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -31,6 +38,22 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names) -> bool:
+    """
+    Объекты, созданные миграциями вручную и не описанные в моделях:
+    autogenerate не должен предлагать их удалить.
+    """
+    # FTS5-таблица поиска в SQLite и её служебные таблицы
+    if type_ == 'table' and name.startswith('products_fts'):
+        return False
+    # Вычисляемая колонка tsvector и её GIN-индекс в Postgres (см. app/search.py)
+    if type_ == 'column' and name == 'search_vector' and parent_names.get('table_name') == 'products':
+        return False
+    if type_ == 'index' and name == 'ix_products_search_vector':
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -49,6 +72,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=db_settings.is_sqlite,
     )
 
     with context.begin_transaction():
@@ -56,7 +80,13 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # SQLite не умеет ALTER для ограничений: autogenerate пишет операции в batch-режиме
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == 'sqlite',
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
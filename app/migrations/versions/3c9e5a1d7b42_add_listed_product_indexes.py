@@ -0,0 +1,42 @@
+"""Add partial indexes for keyset pagination of listed products
+
+Revision ID: 3c9e5a1d7b42
+Revises: f48814b84b2c
+Create Date: 2026-10-17 10:12:31.401218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5a1d7b42'
+down_revision: Union[str, Sequence[str], None] = 'f48814b84b2c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LISTED_INDEXES = {
+    'ix_products_listed_id': ['id'],
+    'ix_products_listed_price_id': ['price', 'id'],
+    'ix_products_listed_rating_id': ['rating', 'id'],
+    'ix_products_listed_category_id': ['category_id', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in LISTED_INDEXES.items():
+        op.create_index(
+            name, 'products', columns, unique=False,
+            postgresql_where=sa.text('is_active = true AND stock > 0'),
+            sqlite_where=sa.text('is_active = 1 AND stock > 0'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(LISTED_INDEXES)):
+        op.drop_index(name, table_name='products')
@@ -37,16 +37,20 @@ def upgrade() -> None:
     sa.UniqueConstraint('username')
     )
     op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
-    op.add_column('products', sa.Column('supplier_id', sa.Integer(), nullable=True))
-    op.create_foreign_key(None, 'products', 'users', ['supplier_id'], ['id'])
+    # batch-режим нужен для SQLite (там таблица пересоздаётся), в Postgres это обычный ALTER TABLE;
+    # имя ограничения совпадает с тем, что Postgres дал бы автоматически
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.add_column(sa.Column('supplier_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('products_supplier_id_fkey', 'users', ['supplier_id'], ['id'])
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, 'products', type_='foreignkey')
-    op.drop_column('products', 'supplier_id')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_constraint('products_supplier_id_fkey', type_='foreignkey')
+        batch_op.drop_column('supplier_id')
     op.drop_index(op.f('ix_users_id'), table_name='users')
     op.drop_table('users')
     # ### end Alembic commands ###
@@ -0,0 +1,72 @@
+"""Add full-text search vector for products
+
+Revision ID: 8d2f6b0c4e19
+Revises: 3c9e5a1d7b42
+Create Date: 2026-10-17 11:04:52.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f6b0c4e19'
+down_revision: Union[str, Sequence[str], None] = '3c9e5a1d7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+# В SQLite вместо tsvector — внешняя FTS5-таблица над products, которую
+# поддерживают в актуальном состоянии триггеры. Вес колонок задаётся в bm25().
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE products_fts USING fts5("
+    "name, description, content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS:
+            op.execute(statement)
+        return
+    op.add_column('products', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+        nullable=True
+    ))
+    op.create_index(
+        'ix_products_search_vector', 'products', ['search_vector'],
+        unique=False, postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'sqlite':
+        for trigger in ('products_fts_update', 'products_fts_delete', 'products_fts_insert'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS products_fts')
+        return
+    op.drop_index('ix_products_search_vector', table_name='products')
+    op.drop_column('products', 'search_vector')
@@ -0,0 +1,39 @@
+"""Add review counters to products
+
+Revision ID: a71e4c2b9f05
+Revises: 8d2f6b0c4e19
+Create Date: 2026-10-17 13:26:08.774390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71e4c2b9f05'
+down_revision: Union[str, Sequence[str], None] = '8d2f6b0c4e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('products', sa.Column('grade_sum', sa.Integer(), server_default='0', nullable=False))
+    # Начальное заполнение по существующим отзывам; для исправления расхождений
+    # позже есть команда app.scripts.rebuild_ratings
+    op.execute(
+        "UPDATE products SET "
+        "review_count = (SELECT count(*) FROM reviews "
+        "WHERE reviews.product_id = products.id AND reviews.is_active), "
+        "grade_sum = (SELECT coalesce(sum(reviews.grade), 0) FROM reviews "
+        "WHERE reviews.product_id = products.id AND reviews.is_active)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'grade_sum')
+    op.drop_column('products', 'review_count')
@@ -0,0 +1,30 @@
+"""Add tokens_valid_after to users for session revocation
+
+Revision ID: b6d3e8f1a2c4
+Revises: e5f19a3c7d20
+Create Date: 2026-10-17 16:05:42.318904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d3e8f1a2c4'
+down_revision: Union[str, Sequence[str], None] = 'e5f19a3c7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('tokens_valid_after', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_users_tokens_valid_after'), 'users', ['tokens_valid_after'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_tokens_valid_after'), table_name='users')
+    op.drop_column('users', 'tokens_valid_after')
@@ -0,0 +1,40 @@
+"""Add per-product grade histogram
+
+Revision ID: c4b80d93e6a7
+Revises: a71e4c2b9f05
+Create Date: 2026-10-17 14:02:45.310972
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4b80d93e6a7'
+down_revision: Union[str, Sequence[str], None] = 'a71e4c2b9f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+GRADES = range(1, 6)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for grade in GRADES:
+        op.add_column('products', sa.Column(f'grade_{grade}_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE products SET " + ", ".join(
+            f"grade_{grade}_count = (SELECT count(*) FROM reviews "
+            f"WHERE reviews.product_id = products.id AND reviews.is_active AND reviews.grade = {grade})"
+            for grade in GRADES
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for grade in reversed(GRADES):
+        op.drop_column('products', f'grade_{grade}_count')
@@ -0,0 +1,62 @@
+"""Make product price and rating NOT NULL
+
+Revision ID: d7a4c1e8b350
+Revises: b6d3e8f1a2c4
+Create Date: 2026-10-17 18:22:09.514307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a4c1e8b350'
+down_revision: Union[str, Sequence[str], None] = 'b6d3e8f1a2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# price и rating — колонки сортировки витрины. Без NULL keyset-пагинация
+# получает диапазонное условие price >= :v вместо OR с хвостом из NULL.
+BACKFILL = [
+    "UPDATE products SET rating = "
+    "COALESCE(ROUND(grade_sum * 1.0 / NULLIF(review_count, 0), 2), 0) "
+    "WHERE rating IS NULL",
+    "UPDATE products SET price = 0 WHERE price IS NULL",
+]
+
+
+def _alter_products(nullable: bool) -> None:
+    # SQLite меняет NOT NULL пересозданием таблицы: триггеры FTS5 и частичные
+    # индексы при этом теряются, поэтому сохраняем их определения и создаём заново
+    sqlite = op.get_context().dialect.name == 'sqlite'
+    schema = []
+    if sqlite:
+        schema = op.get_bind().execute(sa.text(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE tbl_name = 'products' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        )).all()
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.alter_column('price', existing_type=sa.Integer(), nullable=nullable)
+        batch_op.alter_column('rating', existing_type=sa.Float(), nullable=nullable)
+    if sqlite:
+        existing = set(op.get_bind().execute(sa.text(
+            "SELECT name FROM sqlite_master WHERE tbl_name = 'products'"
+        )).scalars())
+        for name, sql in schema:
+            if name not in existing:
+                op.execute(sql)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for statement in BACKFILL:
+        op.execute(statement)
+    _alter_products(nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _alter_products(nullable=True)
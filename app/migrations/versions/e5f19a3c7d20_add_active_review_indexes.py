@@ -0,0 +1,42 @@
+"""Add partial indexes for paginated active reviews
+
+Revision ID: e5f19a3c7d20
+Revises: c4b80d93e6a7
+Create Date: 2026-10-17 14:48:19.025531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f19a3c7d20'
+down_revision: Union[str, Sequence[str], None] = 'c4b80d93e6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ACTIVE_INDEXES = {
+    'ix_reviews_active_date': ['comment_date DESC', 'id'],
+    'ix_reviews_product_active_date': ['product_id', 'comment_date DESC', 'id'],
+    'ix_reviews_product_active_grade_desc': ['product_id', 'grade DESC', 'comment_date DESC', 'id'],
+    'ix_reviews_product_active_grade_asc': ['product_id', 'grade', 'comment_date DESC', 'id'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in ACTIVE_INDEXES.items():
+        op.create_index(
+            name, 'reviews', [sa.text(column) for column in columns], unique=False,
+            postgresql_where=sa.text('is_active = true'),
+            sqlite_where=sa.text('is_active = 1'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(ACTIVE_INDEXES)):
+        op.drop_index(name, table_name='reviews')
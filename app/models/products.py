@@ -1,22 +1,50 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import Integer, String, Float, Boolean, ForeignKey, Index, text, literal_column
 
 from app.backend.db import Base
 
 
+def listed_index(name: str, *columns: str) -> Index:
+    """
+    Частичный индекс только по товарам, которые видны на витрине
+    (активные и в наличии).
+    """
+    return Index(
+        name,
+        *columns,
+        postgresql_where=text('is_active = true AND stock > 0'),
+        sqlite_where=text('is_active = 1 AND stock > 0'),
+    )
+
+
 class Product(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        listed_index('ix_products_listed_id', 'id'),
+        listed_index('ix_products_listed_price_id', 'price', 'id'),
+        listed_index('ix_products_listed_rating_id', 'rating', 'id'),
+        listed_index('ix_products_listed_category_id', 'category_id', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, nullable=True)
     slug: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=True)
     description: Mapped[str] = mapped_column(String, nullable=True)
-    price: Mapped[int] = mapped_column(Integer, nullable=True)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)
     image_url: Mapped[str] = mapped_column(String, nullable=True)
     stock: Mapped[int] = mapped_column(Integer, nullable=True)
     supplier_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
     category_id: Mapped[int] = mapped_column(Integer, ForeignKey('categories.id'))
-    rating: Mapped[float] = mapped_column(Float, nullable=True)
+    rating: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    # Счётчики активных отзывов; rating вычисляется из них при каждом изменении
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    grade_sum: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    # Гистограмма оценок активных отзывов (сколько отзывов с оценкой 1, 2, ..., 5)
+    grade_1_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    grade_2_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    grade_3_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    grade_4_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
+    grade_5_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=True)
 
     category: Mapped['Category'] = relationship(
@@ -24,3 +52,11 @@ class Product(Base):
         back_populates='products'
     )
     reviews: Mapped[list['Reviews']] = relationship(back_populates='product')
+
+
+# Условие "товар виден на витрине". Значения подставляются в SQL литералами,
+# чтобы условие совпадало с предикатом частичных индексов listed_index().
+LISTED = (
+    Product.is_active == True,
+    Product.stock > literal_column('0'),
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Integer, String, ForeignKey, DateTime, Boolean, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 
@@ -19,3 +19,27 @@ class Reviews(Base):
 
     user: Mapped['User'] = relationship(back_populates='reviews')
     product: Mapped['Product'] = relationship(back_populates='reviews')
+
+
+# Условие "отзыв не удалён"; литерал вместо параметра, чтобы условие совпадало
+# с предикатом частичных индексов ниже
+ACTIVE = Reviews.is_active == True
+
+
+def active_index(name: str, *columns) -> Index:
+    """
+    Частичный индекс только по активным отзывам.
+    """
+    return Index(
+        name,
+        *columns,
+        postgresql_where=text('is_active = true'),
+        sqlite_where=text('is_active = 1'),
+    )
+
+
+# Индексы под варианты сортировки отзывов (см. REVIEW_SORTS в app/routers/reviews.py)
+active_index('ix_reviews_active_date', Reviews.comment_date.desc(), Reviews.id)
+active_index('ix_reviews_product_active_date', Reviews.product_id, Reviews.comment_date.desc(), Reviews.id)
+active_index('ix_reviews_product_active_grade_desc', Reviews.product_id, Reviews.grade.desc(), Reviews.comment_date.desc(), Reviews.id)
+active_index('ix_reviews_product_active_grade_asc', Reviews.product_id, Reviews.grade, Reviews.comment_date.desc(), Reviews.id)
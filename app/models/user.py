@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean
+from sqlalchemy import Integer, String, Boolean, DateTime
+from datetime import datetime
 
 from app.backend.db import Base
 
@@ -17,5 +18,7 @@ class User(Base):
     is_admin: Mapped[bool] = mapped_column(Boolean, nullable=True, default=False)
     is_supplier: Mapped[bool] = mapped_column(Boolean, nullable=True, default=False)
     is_customer: Mapped[bool] = mapped_column(Boolean, nullable=True, default=True)
+    # Токены, выданные раньше этого момента (UTC), недействительны
+    tokens_valid_after: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
 
     reviews: Mapped[list['Reviews']] = relationship(back_populates='user')
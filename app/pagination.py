@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, false
+from sqlalchemy.sql.elements import ColumnElement
+
+
+# Порядок сортировки для keyset-пагинации: (колонка, по убыванию?)
+KeysetOrder = Sequence[tuple[Any, bool]]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f'Cannot encode {type(value).__name__} into cursor')
+
+
+def _object_hook(value: dict):
+    if '$dt' in value:
+        return datetime.fromisoformat(value['$dt'])
+    return value
+
+
+def encode_cursor(values: Sequence) -> str:
+    """
+    Упаковывает значения ключей последней строки страницы в непрозрачный курсор.
+    """
+    raw = json.dumps(list(values), default=_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _python_type(column) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        # Выражения без явного типа (ранг поиска) — числа
+        return float
+
+
+def _valid_value(column, value) -> bool:
+    if value is None:
+        return _is_nullable(column)
+    if isinstance(value, bool):
+        return False
+    expected = _python_type(column)
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, order: KeysetOrder) -> list:
+    """
+    Распаковывает курсор, полученный от клиента.
+    Вызывает 400, если курсор повреждён или не подходит к текущей сортировке:
+    число значений и их типы должны совпадать с колонками `order`.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw, object_hook=_object_hook)
+    except (binascii.Error, ValueError, TypeError):
+        values = None
+    if (
+            not isinstance(values, list)
+            or len(values) != len(order)
+            or not all(_valid_value(column, value) for (column, _), value in zip(order, values))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor'
+        )
+    return values
+
+
+def _is_nullable(column) -> bool:
+    return getattr(getattr(column, 'expression', column), 'nullable', False)
+
+
+def keyset_order_by(order: KeysetOrder) -> list[ColumnElement]:
+    """
+    Возвращает выражения ORDER BY для keyset-пагинации.
+
+    NULL считается наибольшим значением (как в Postgres по умолчанию),
+    поэтому порядок совпадает с порядком обхода обычного B-tree индекса.
+    """
+    clauses = []
+    for column, descending in order:
+        clause = column.desc() if descending else column.asc()
+        if _is_nullable(column):
+            clause = clause.nulls_first() if descending else clause.nulls_last()
+        clauses.append(clause)
+    return clauses
+
+
+def _after(column, value, descending: bool) -> ColumnElement:
+    nullable = _is_nullable(column)
+    if value is None:
+        # NULL — наибольшее значение: после него по возрастанию ничего нет,
+        # а по убыванию идут все не-NULL значения
+        return column.is_not(None) if descending else false()
+    if descending:
+        return column < value
+    if nullable:
+        return or_(column > value, column.is_(None))
+    return column > value
+
+
+def _equal(column, value) -> ColumnElement:
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_filter(order: KeysetOrder, values: Sequence) -> ColumnElement:
+    """
+    Условие "строка идёт после (values)" в лексикографическом порядке `order`.
+    Позволяет листать страницы без OFFSET: каждая следующая страница —
+    это просто диапазонный проход по индексу с того места, где закончилась предыдущая.
+    """
+    branches = []
+    for i, (column, descending) in enumerate(order):
+        prefix = [_equal(col, value) for (col, _), value in zip(order[:i], values[:i])]
+        branches.append(and_(*prefix, _after(column, values[i], descending)))
+    condition = or_(*branches)
+
+    # Ограничение по первой колонке даёт планировщику начало диапазона в индексе.
+    # По убыванию NULL идут первыми и уже пройдены, поэтому граница верна и для
+    # nullable-колонки; по возрастанию после значений идёт хвост из NULL.
+    column, descending = order[0]
+    first = values[0]
+    if first is not None and (descending or not _is_nullable(column)):
+        condition = and_(column <= first if descending else column >= first, condition)
+    return condition
+
+
+def paginate(rows: list, limit: int, key) -> dict:
+    """
+    Формирует страницу ответа из limit + 1 выбранных строк.
+    `key` возвращает значения ключей сортировки для строки.
+    """
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(key(items[-1])) if has_more else None,
+    }
@@ -0,0 +1,51 @@
+from sqlalchemy import Numeric, cast, func
+
+from app.models.products import Product
+
+
+# Допустимые оценки отзыва (см. CreateReview.grade)
+GRADES = range(1, 6)
+
+
+def grade_column(grade: int):
+    """
+    Колонка гистограммы оценок для оценки grade.
+    """
+    return getattr(Product, f'grade_{grade}_count')
+
+
+def rating_expression(grade_sum, review_count):
+    """
+    Рейтинг как среднее оценок, округлённое до двух знаков; 0 — если отзывов нет.
+    """
+    return func.coalesce(
+        func.round(cast(grade_sum, Numeric) / func.nullif(review_count, 0), 2),
+        0
+    )
+
+
+def rating_changes(delta: dict[int, int]) -> dict:
+    """
+    Значения для UPDATE products, когда число отзывов с каждой оценкой
+    изменилось на delta[grade] (положительное — добавлены, отрицательное — удалены).
+    Счётчики меняются относительно текущих значений строки, поэтому один
+    UPDATE атомарен и не требует пересчёта AVG по всем отзывам товара.
+    """
+    review_count = Product.review_count + sum(delta.values())
+    grade_sum = Product.grade_sum + sum(grade * count for grade, count in delta.items())
+    values = {
+        'review_count': review_count,
+        'grade_sum': grade_sum,
+        'rating': rating_expression(grade_sum, review_count),
+    }
+    for grade, count in delta.items():
+        values[grade_column(grade).key] = grade_column(grade) + count
+    return values
+
+
+def review_added(grade: int) -> dict:
+    return rating_changes({grade: 1})
+
+
+def review_removed(grade: int) -> dict:
+    return rating_changes({grade: -1})
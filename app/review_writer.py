@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.backend.db import async_session_maker
+from app.cache import invalidate_product
+from app.models.products import Product
+from app.models.reviews import Reviews
+from app.ratings import rating_changes
+
+
+logger = logging.getLogger(__name__)
+
+# Режим отложенной записи отзывов включается переменной окружения
+REVIEW_WRITE_BEHIND = os.getenv('REVIEW_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+
+# Максимум отзывов в очереди: при заполнении add_review отвечает 503
+QUEUE_SIZE = 10_000
+# Максимум отзывов в одной записи в базу и максимальная задержка записи (сек.)
+FLUSH_BATCH = 500
+FLUSH_INTERVAL = 0.5
+# Повторы записи пачки при ошибке базы: число попыток и задержки между ними (сек.)
+FLUSH_RETRIES = 4
+RETRY_DELAY = 0.5
+RETRY_DELAY_MAX = 5.0
+
+
+class ReviewWriteBehind:
+    """
+    Отложенная запись отзывов.
+
+    add_review только кладёт отзыв в ограниченную очередь и сразу отвечает;
+    фоновая задача раз в FLUSH_INTERVAL (или по набору FLUSH_BATCH отзывов)
+    записывает их одним многострочным INSERT, а счётчики рейтинга обновляет
+    одним UPDATE на товар, сколько бы отзывов о нём ни пришло за это время.
+
+    Клиенту уже ответили, поэтому при ошибке пачка не выбрасывается: запись
+    повторяется с нарастающей задержкой, а если база так и не приняла пачку —
+    отзывы пишутся по одному, и теряются только те, что не записываются сами по себе.
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            enabled: bool = REVIEW_WRITE_BEHIND,
+            maxsize: int = QUEUE_SIZE,
+            batch_size: int = FLUSH_BATCH,
+            interval: float = FLUSH_INTERVAL
+    ):
+        self.session_maker = session_maker
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=maxsize)
+        self.written = 0
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    def submit(self, review: dict) -> bool:
+        """
+        Ставит отзыв в очередь. False — очередь заполнена или идёт остановка.
+        """
+        if self._closing or self._task is None:
+            return False
+        review.setdefault('comment_date', datetime.utcnow())
+        try:
+            self.queue.put_nowait(review)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Перестаёт принимать отзывы и дожидается записи всего, что уже в очереди.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        await self._task
+        self._task = None
+
+    async def _collect(self) -> list[dict]:
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while not (self._closing and self.queue.empty()):
+            batch = await self._collect()
+            if batch and not await self._flush_with_retry(batch):
+                # Пачку не удалось записать целиком — ищем отзывы, из-за которых она падает
+                for review in batch:
+                    if not await self._flush_with_retry([review], retries=1):
+                        self.dropped += 1
+
+    async def _flush_with_retry(self, batch: list[dict], retries: int = FLUSH_RETRIES) -> bool:
+        delay = RETRY_DELAY
+        for attempt in range(1, retries + 1):
+            try:
+                await self.flush(batch)
+                return True
+            except Exception:
+                logger.exception('Failed to write %d reviews (attempt %d of %d)', len(batch), attempt, retries)
+            if attempt < retries:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_DELAY_MAX)
+        return False
+
+    async def flush(self, batch: list[dict]) -> None:
+        deltas: dict[int, Counter] = {}
+        for review in batch:
+            deltas.setdefault(review['product_id'], Counter())[review['grade']] += 1
+
+        async with self.session_maker() as db:
+            products = {}
+            # Строки товаров блокируются в одном порядке, чтобы не ловить взаимные
+            # блокировки с другими воркерами
+            for product_id, delta in sorted(deltas.items()):
+                product = (await db.execute(
+                    update(Product)
+                    .where(Product.id == product_id, Product.is_active.is_(True))
+                    .values(**rating_changes(dict(delta)))
+                    .returning(Product.slug, Product.category_id)
+                )).first()
+                if product is not None:
+                    products[product_id] = product
+
+            # Товар могли снять с продажи, пока отзыв ждал в очереди
+            rows = [review for review in batch if review['product_id'] in products]
+            if rows:
+                await db.execute(insert(Reviews), rows)
+            await db.commit()
+
+        self.written += len(rows)
+        self.dropped += len(batch) - len(rows)
+        # Пачка уже записана: ошибка кэша не должна приводить к повторной вставке
+        try:
+            await invalidate_product(
+                [product.slug for product in products.values()],
+                {product.category_id for product in products.values()}
+            )
+        except Exception:
+            logger.exception('Failed to invalidate cache after writing %d reviews', len(rows))
+
+
+review_writer = ReviewWriteBehind(async_session_maker)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.backend.db import primary_read_session_maker
+from app.models.user import User
+from app.token_cache import token_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Время жизни access-токена. Отзыв старше этого срока помнить не нужно:
+# все выданные до него токены уже истекли сами.
+TOKEN_LIFETIME = timedelta(minutes=20)
+
+# Как часто подтягивать отзывы, сделанные другими воркерами, и с каким
+# перекрытием (запись могла закоммититься позже своей метки времени)
+REVOCATION_REFRESH = 5.0
+REVOCATION_OVERLAP = timedelta(seconds=30)
+
+
+def revocation_time() -> datetime:
+    """
+    Момент отзыва в том же виде, в котором он хранится в users.tokens_valid_after (UTC без зоны).
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class Revocations:
+    """
+    Отозванные сессии: для пользователя хранится момент, раньше которого
+    выданные ему токены недействительны (users.tokens_valid_after).
+
+    Проверка в get_current_user — одно обращение к словарю, без запроса в базу.
+    Эндпоинты прав обновляют словарь сразу, а изменения из других воркеров
+    подтягиваются фоновым запросом по индексу только за последние TOKEN_LIFETIME.
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            horizon: timedelta = TOKEN_LIFETIME,
+            interval: float = REVOCATION_REFRESH
+    ):
+        self.session_maker = session_maker
+        self.horizon = horizon
+        self.interval = interval
+        self._valid_after: dict[int, float] = {}
+        self._last_seen: datetime | None = None
+        self._task: asyncio.Task | None = None
+
+    def is_revoked(self, user_id: int, issued_at: float) -> bool:
+        valid_after = self._valid_after.get(user_id)
+        return valid_after is not None and issued_at < valid_after
+
+    def revoke(self, user_ids: Iterable[int], at: datetime) -> None:
+        """
+        Запоминает отзыв, уже записанный в базу в tokens_valid_after = at.
+        """
+        valid_after = _timestamp(at)
+        for user_id in user_ids:
+            self._valid_after[user_id] = max(self._valid_after.get(user_id, 0.0), valid_after)
+            token_cache.purge_user(user_id)
+
+    async def refresh(self) -> None:
+        now = revocation_time()
+        if self._last_seen is None:
+            since = now - self.horizon
+        else:
+            since = max(self._last_seen - REVOCATION_OVERLAP, now - self.horizon)
+        async with self.session_maker() as db:
+            rows = (await db.execute(
+                select(User.id, User.tokens_valid_after).where(User.tokens_valid_after > since)
+            )).all()
+        for user_id, valid_after in rows:
+            self.revoke([user_id], valid_after)
+            if self._last_seen is None or valid_after > self._last_seen:
+                self._last_seen = valid_after
+        if self._last_seen is None:
+            self._last_seen = since
+
+        # Токены, выданные раньше (now - horizon), уже истекли — такие отзывы не нужны
+        expired = _timestamp(now - self.horizon)
+        for user_id in [user_id for user_id, valid_after in self._valid_after.items() if valid_after < expired]:
+            del self._valid_after[user_id]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception('Failed to refresh revoked sessions')
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception('Failed to load revoked sessions')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._valid_after)
+
+
+# Отзыв нельзя читать с отстающей реплики, а на SQLite — через единственного писателя
+revocations = Revocations(primary_read_session_maker)
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Request, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, update
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 import jwt
 
 from app.models.user import User
 from app.schemas import CreateUser
 from app.backend.db_depends import get_db
+from app.hashing import password_hasher
+from app.token_cache import token_cache
+from app.throttling import login_throttle
+from app.revocation import revocations, TOKEN_LIFETIME
 
 
 # (.venv) subcom@cspbw143:~/PycharmProjects/fastapi_ecommerce$ openssl rand -hex 32
@@ -23,24 +26,31 @@ router = APIRouter(prefix='/auth', tags=['auth'])
 # Схема авторизации OAuth2 (ожидает токен по пути /auth/token)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
 
-# Контекст шифрования паролей: указываем использовать алгоритм bcrypt
-# deprecated='auto' означает, что старые схемы считаются устаревшими
-bcrypt_context = CryptContext(
-    schemes=['bcrypt'],     # допустимые алгоритмы
-    deprecated='auto')
-
 
 async def authenticate_user(db: Annotated[AsyncSession, Depends(get_db)], username: str, password: str):
     """
     Проверяет, существует ли пользователь с заданным именем и паролем.
     """
     user = await db.scalar(select(User).where(User.username == username))
-    if not user or not bcrypt_context.verify(password, user.hashed_password) or user.is_active == False:
+    # Завершаем транзакцию до bcrypt: соединение возвращается в пул и не
+    # удерживается (а в SQLite не блокирует запись) на всё время хеширования
+    await db.commit()
+    if user:
+        # bcrypt выполняется в пуле потоков и не блокирует остальные запросы
+        verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    else:
+        verified, new_hash = False, None
+    if not verified or user.is_active == False:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Invalid authentication credentials',
             headers={'WWW-Authenticate': 'Bearer'},
         )
+    if new_hash:
+        # Хеш сделан с другой стоимостью bcrypt — сохраняем пересчитанный
+        # отдельной короткой транзакцией
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
     return user
 
 
@@ -50,85 +60,116 @@ async def create_access_token(
         is_admin: bool,
         is_supplier: bool,
         is_customer: bool,
-        expires_delta: timedelta
+        expires_delta: timedelta,
+        issued_at: datetime | None = None
 ):
     """
     Создаёт JWT-токен с данными пользователя и временем жизни.
+    issued_at — момент, на который актуальны права в токене (по умолчанию — сейчас).
     """
+    if issued_at is None:
+        issued_at = datetime.now(timezone.utc)
     payload = {
          'sub': username,
          'id': user_id,
          'is_admin': is_admin,
          'is_supplier': is_supplier,
          'is_customer': is_customer,
-         'exp': datetime.now(timezone.utc) + expires_delta
+         'exp': issued_at + expires_delta
      }
     # Преобразование datetime в timestamp (количество секунд с начала эпохи)
     payload['exp'] = int(payload['exp'].timestamp())
+    # Время выдачи с долями секунды: по нему отсекаются токены, выданные до отзыва
+    payload['iat'] = issued_at.timestamp()
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+def decode_token(token: str) -> tuple[dict, int, float]:
     """
-    Декодирует токен и извлекает информацию о текущем пользователе.
-    Вызывает исключение, если токен некорректный или устарел.
+    Декодирует токен, проверяет подпись и срок действия.
+    Возвращает данные пользователя, время истечения и время выдачи токена.
     """
     try:
         # Расшифровываем токен и получаем полезную нагрузку
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get('sub')
-        user_id: int | None = payload.get('id')
-        is_admin: bool | None = payload.get('is_admin')
-        is_supplier: bool | None = payload.get('is_supplier')
-        is_customer: bool | None = payload.get('is_customer')
-        expire: int | None = payload.get('exp')
-
-        # Проверяем наличие обязательных полей
-        if username is None or user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail='Could not validate user'
-            )
-
-        if expire is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='No access token supplied'
-            )
-
-        if not isinstance(expire, int):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='Invalid token format'
-            )
-
-        # Проверка срока действия токена
-        current_time = datetime.now(timezone.utc).timestamp()
-
-        if expire < current_time:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail='Token expired!'
-            )
-
-        return {
-            'username': username,
-            'id': user_id,
-            'is_admin': is_admin,
-            'is_supplier': is_supplier,
-            'is_customer': is_customer,
-        }
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Token expired!'
         )
-    except jwt.exceptions:
+    except jwt.PyJWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Could not validate user'
+        )
+
+    username: str | None = payload.get('sub')
+    user_id: int | None = payload.get('id')
+    is_admin: bool | None = payload.get('is_admin')
+    is_supplier: bool | None = payload.get('is_supplier')
+    is_customer: bool | None = payload.get('is_customer')
+    expire: int | None = payload.get('exp')
+    # Токены без iat выданы до появления отзыва сессий
+    issued_at: float = payload.get('iat', 0)
+
+    # Проверяем наличие обязательных полей
+    if username is None or user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate user'
         )
 
+    if expire is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='No access token supplied'
+        )
+
+    if not isinstance(expire, int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid token format'
+        )
+
+    # Проверка срока действия токена
+    current_time = datetime.now(timezone.utc).timestamp()
+
+    if expire < current_time:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Token expired!'
+        )
+
+    return {
+        'username': username,
+        'id': user_id,
+        'is_admin': is_admin,
+        'is_supplier': is_supplier,
+        'is_customer': is_customer,
+    }, expire, issued_at
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    """
+    Декодирует токен и извлекает информацию о текущем пользователе.
+    Вызывает исключение, если токен некорректный или устарел.
+
+    Уже проверенные токены берутся из token_cache до истечения их срока.
+    Отозванные сессии (см. app/revocation.py) отклоняются и при попадании в кэш.
+    """
+    cached = token_cache.get(token)
+    if cached is None:
+        user, expire, issued_at = decode_token(token)
+        token_cache.put(token, user, expire, issued_at)
+    else:
+        user, issued_at = cached
+    if revocations.is_revoked(user['id'], issued_at):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Session has been revoked'
+        )
+    return user
+
 
 @router.post('/', status_code=status.HTTP_201_CREATED)
 async def create_user(
@@ -144,7 +185,7 @@ async def create_user(
             last_name=created_user.last_name,
             username=created_user.username,
             email=created_user.email,
-            hashed_password=bcrypt_context.hash(created_user.password)
+            hashed_password=await password_hasher.hash(created_user.password)
         )
     )
     await db.commit()
@@ -157,6 +198,7 @@ async def create_user(
 
 @router.post('/token')
 async def login(
+        request: Request,
         db: Annotated[AsyncSession, Depends(get_db)],
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ):
@@ -164,13 +206,19 @@ async def login(
     Авторизует пользователя, проверяя имя и пароль.
     Возвращает JWT-токен при успешной авторизации.
     """
+    # Лимит попыток проверяется до запроса к базе и bcrypt
+    await login_throttle.check(request, form_data.username)
+    # iat — момент до чтения пользователя, а не после bcrypt: если права изменят,
+    # пока идёт проверка пароля, токен со старыми правами попадёт под отзыв
+    issued_at = datetime.now(timezone.utc)
     user = await authenticate_user(db, form_data.username, form_data.password)
     token = await create_access_token(user.username,
                                       user.id,
                                       user.is_admin,
                                       user.is_supplier,
                                       user.is_customer,
-                                      expires_delta=timedelta(minutes=20)
+                                      expires_delta=TOKEN_LIFETIME,
+                                      issued_at=issued_at
                                       )
 
     return {
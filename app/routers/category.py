@@ -1,13 +1,15 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Request
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import insert, select
 from slugify import slugify
 
-from app.backend.db_depends import get_db
+from app.backend.db_depends import get_db, get_primary_read_db
 from app.schemas import CreateCategory
 from app.models.category import Category
 from app.routers.auth import get_current_user
+from app.category_tree import category_tree
+from app.cache import response_cache
 
 
 router = APIRouter(prefix='/categories', tags=['category'])
@@ -15,15 +17,19 @@ router = APIRouter(prefix='/categories', tags=['category'])
 
 @router.get('/')
 async def get_all_categories(
-        db: Annotated[AsyncSession, Depends(get_db)]     # Получаем подключение к БД через Depends
+        request: Request,
+        db: Annotated[AsyncSession, Depends(get_primary_read_db)]     # Получаем подключение к БД через Depends
 ):
-    # Выполняем SELECT * FROM categories WHERE is_active = true
-    # scalars() возвращает множество объектов (а не одно значение)
-    categories = await db.scalars(
-        select(Category).where(Category.is_active == True)
-    )
-    # Возвращаем список категорий (FastAPI преобразует в JSON)
-    return categories.all()
+    async def load():
+        # Выполняем SELECT * FROM categories WHERE is_active = true
+        # scalars() возвращает множество объектов (а не одно значение)
+        categories = await db.scalars(
+            select(Category).where(Category.is_active == True)
+        )
+        return categories.all()
+
+    # Список категорий меняется редко — отдаём его из кэша ответов (с ETag)
+    return await response_cache.respond(request, 'categories', ('categories',), load)
 
 
 @router.post('/')
@@ -39,6 +45,10 @@ async def create_category(
             slug=slugify(create_category.name)
         ))
         await db.commit()
+        # Структура дерева изменилась — кэш категорий и списки товаров по категориям
+        # нужно перестроить
+        category_tree.invalidate()
+        await response_cache.invalidate('categories', 'category-tree')
         return {
             'status_code': status.HTTP_201_CREATED,
             'transaction': 'Successful'
@@ -70,6 +80,8 @@ async def update_category(
         category.parent_id = update_category.parent_id
 
         await db.commit()
+        category_tree.invalidate()
+        await response_cache.invalidate('categories', 'category-tree')
         return {
             'status_code': status.HTTP_200_OK,
             'detail': 'Category update is successful'
@@ -97,6 +109,8 @@ async def delete_category(
             )
         category.is_active = False
         await db.commit()
+        category_tree.invalidate()
+        await response_cache.invalidate('categories', 'category-tree')
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
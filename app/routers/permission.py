@@ -1,18 +1,39 @@
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, not_, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from starlette import status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.backend.db_depends import get_db
 from app.models.user import User
+from app.schemas import UserIds
 from app.routers.auth import get_current_user
+from app.revocation import revocations, revocation_time
 
 
 # Создание маршрутизатора для работы с правами (permissions)
 router = APIRouter(prefix='/permission', tags=['permission'])
 
 
+async def revoke_sessions(db: AsyncSession, user_ids: list[int]) -> None:
+    """
+    Отзывает токены пользователей, выданные до этого момента.
+
+    Вызывается после commit изменения прав: вход, прочитавший пользователя до
+    commit, получил iat раньше момента отзыва, и его токен со старыми правами
+    тоже будет отклонён.
+    """
+    if not user_ids:
+        return
+    revoked_at = revocation_time()
+    await db.execute(
+        update(User).where(user_ids_condition(db, user_ids)).values(tokens_valid_after=revoked_at)
+    )
+    await db.commit()
+    revocations.revoke(user_ids, revoked_at)
+
+
 @router.patch('/')
 async def supplier_permission(
         db: Annotated[AsyncSession, Depends(get_db)],
@@ -45,6 +66,8 @@ async def supplier_permission(
                     is_supplier=False, is_customer=True
                 ))
             await db.commit()
+            # Права изменились — выданные раньше токены несут старые права, отзываем их
+            await revoke_sessions(db, [user_id])
             return {
                 'status_code': status.HTTP_200_OK,
                 'detail': 'User is no longer supplier'
@@ -58,6 +81,7 @@ async def supplier_permission(
                     is_customer=False
                 ))
             await db.commit()
+            await revoke_sessions(db, [user_id])
             return {
                 'status_code': status.HTTP_200_OK,
                 'detail': 'User is now supplier'
@@ -108,6 +132,7 @@ async def delete_user(
         if user.is_active:
             await db.execute(update(User).where(User.id == user_id).values(is_active=False))
             await db.commit()
+            await revoke_sessions(db, [user_id])
             return {
                 'status_code': status.HTTP_200_OK,
                 'detail': 'User is deleted'
@@ -124,3 +149,118 @@ async def delete_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You dont have admin permission'
         )
+
+
+def user_ids_condition(db: AsyncSession, user_ids: list[int]):
+    if db.get_bind().dialect.name == 'postgresql':
+        # Один параметр-массив вместо IN (...) с тысячами параметров
+        return User.id == any_(bindparam('user_ids', user_ids, type_=ARRAY(User.id.type)))
+    return User.id.in_(user_ids)
+
+
+def check_admin(get_user: dict) -> None:
+    if not get_user.get('is_admin'):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You dont have admin permission'
+        )
+
+
+@router.patch('/bulk')
+async def bulk_supplier_permission(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        get_user: Annotated[dict, Depends(get_current_user)],
+        users: UserIds
+):
+    """
+    Пакетный вариант supplier_permission: переключает статус продавца у списка пользователей.
+
+    Все пользователи обновляются одним UPDATE ... RETURNING в одной транзакции,
+    администраторы не затрагиваются. В ответе для каждого ID — то же сообщение,
+    что вернул бы одиночный метод.
+    """
+    check_admin(get_user)
+    user_ids = list(dict.fromkeys(users.user_ids))
+    is_supplier = func.coalesce(User.is_supplier, False)
+    # В SET справа используются старые значения строки: продавец становится
+    # клиентом и наоборот
+    rows = await db.execute(
+        update(User)
+        .where(user_ids_condition(db, user_ids), User.is_active.is_(True), User.is_admin.is_not(True))
+        .values(is_supplier=not_(is_supplier), is_customer=is_supplier)
+        .returning(User.id, User.is_supplier)
+    )
+    updated = {row.id: row.is_supplier for row in rows}
+    skipped = [user_id for user_id in user_ids if user_id not in updated]
+    admins = set()
+    if skipped:
+        admins = set((await db.execute(
+            select(User.id).where(user_ids_condition(db, skipped), User.is_active.is_(True), User.is_admin.is_(True))
+        )).scalars())
+    await db.commit()
+    await revoke_sessions(db, list(updated))
+
+    results = []
+    for user_id in user_ids:
+        if user_id in admins:
+            detail = "You can't admin user"
+        elif user_id not in updated:
+            detail = 'User not found'
+        elif updated[user_id]:
+            detail = 'User is now supplier'
+        else:
+            detail = 'User is no longer supplier'
+        results.append({'user_id': user_id, 'detail': detail})
+    return {
+        'status_code': status.HTTP_200_OK,
+        'results': results
+    }
+
+
+@router.delete('/bulk')
+async def bulk_delete_users(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        get_user: Annotated[dict, Depends(get_current_user)],
+        users: UserIds
+):
+    """
+    Пакетный вариант delete_user: деактивирует список пользователей.
+
+    Активные пользователи (кроме администраторов) деактивируются одним UPDATE ... RETURNING,
+    причину пропуска остальных определяет один SELECT.
+    """
+    check_admin(get_user)
+    user_ids = list(dict.fromkeys(users.user_ids))
+    rows = await db.execute(
+        update(User)
+        .where(user_ids_condition(db, user_ids), User.is_active.is_(True), User.is_admin.is_not(True))
+        .values(is_active=False)
+        .returning(User.id)
+    )
+    deleted = set(rows.scalars())
+    skipped = [user_id for user_id in user_ids if user_id not in deleted]
+    existing = {}
+    if skipped:
+        existing = {
+            row.id: row for row in await db.execute(
+                select(User.id, User.is_admin).where(user_ids_condition(db, skipped))
+            )
+        }
+    await db.commit()
+    await revoke_sessions(db, list(deleted))
+
+    results = []
+    for user_id in user_ids:
+        if user_id in deleted:
+            detail = 'User is deleted'
+        elif user_id not in existing:
+            detail = 'User not found'
+        elif existing[user_id].is_admin:
+            detail = "You can't admin user"
+        else:
+            detail = 'User has already been deleted'
+        results.append({'user_id': user_id, 'detail': detail})
+    return {
+        'status_code': status.HTTP_200_OK,
+        'results': results
+    }
@@ -1,33 +1,118 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Annotated
-from sqlalchemy import insert, select, update
+from typing import Annotated, Literal
+from sqlalchemy import insert, select, update, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from slugify import slugify
 
-from app.backend.db_depends import get_db
-from app.schemas import CreateProduct
-from app.models.products import Product
+from app.backend.db_depends import get_db, get_read_db, get_primary_read_db
+from app.schemas import CreateProduct, ProductFilter, ProductBatch
+from app.models.products import Product, LISTED
 from app.models.category import Category
+from app.models.reviews import Reviews
 from app.routers.auth import get_current_user
+from app.routers.reviews import review_page
+from app.category_tree import category_tree
+from app.pagination import decode_cursor, keyset_filter, keyset_order_by, paginate
+from app.search import search_terms, search_clauses
+from app.facets import product_facets
+from app.cache import response_cache, request_key, invalidate_product
+from app.bulk_import import BulkImport, ImportFormat, iter_rows
+from app.export import ExportFormat, MEDIA_TYPES, export_products
+from app.fieldsets import Fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS, REVIEW_FIELDS, resolve_fields, select_columns, project
 
 
 
 router = APIRouter(prefix='/product', tags=['products'])
 
+# Что можно добавить в карточку товара через include=
+PRODUCT_INCLUDES = ('category', 'reviews', 'breadcrumbs')
 
-@router.get('/')
-async def all_products(db: Annotated[AsyncSession, Depends(get_db)]):
-    products = await db.scalars(select(Product).where(
-        Product.is_active == True,
-        Product.stock > 0
-        )
+# Варианты сортировки витрины. Последней колонкой всегда идёт id,
+# чтобы порядок был строгим и курсор однозначно указывал на строку.
+# Каждому варианту соответствует частичный индекс listed_index() в модели.
+ProductSort = Literal['id', 'price', '-price', 'rating', '-rating']
+PRODUCT_SORTS = {
+    'id': ((Product.id, False),),
+    'price': ((Product.price, False), (Product.id, False)),
+    '-price': ((Product.price, True), (Product.id, True)),
+    'rating': ((Product.rating, False), (Product.id, False)),
+    '-rating': ((Product.rating, True), (Product.id, True)),
+}
+
+
+async def product_page(
+        db: AsyncSession,
+        conditions: list,
+        sort: ProductSort,
+        limit: int,
+        cursor: str | None,
+        fields: list[str]
+) -> dict:
+    """
+    Возвращает страницу товаров витрины с keyset-пагинацией.
+    Стоимость любой страницы одинакова: вместо OFFSET запрос продолжает
+    проход по индексу с ключа последней строки предыдущей страницы.
+    Из базы читаются только запрошенные поля и ключи сортировки.
+    """
+    order = PRODUCT_SORTS[sort]
+    keys = [column.key for column, _ in order]
+    query = select(*select_columns(PRODUCT_FIELDS, fields, *keys)).where(*LISTED, *conditions)
+    if cursor is not None:
+        query = query.where(keyset_filter(order, decode_cursor(cursor, order)))
+    rows = await db.execute(
+        query.order_by(*keyset_order_by(order)).limit(limit + 1)
     )
-    if not products:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='Category not found'
-        )
-    return products.all()
+    page = paginate(rows.all(), limit, key=lambda row: [getattr(row, key) for key in keys])
+    page['items'] = [project(row, fields) for row in page['items']]
+    return page
+
+
+async def filter_conditions(db: AsyncSession, filters: ProductFilter) -> list:
+    """
+    Переводит фильтры витрины в условия WHERE для запроса товаров.
+    """
+    conditions = []
+    if filters.price_min is not None:
+        conditions.append(Product.price >= filters.price_min)
+    if filters.price_max is not None:
+        conditions.append(Product.price <= filters.price_max)
+    if filters.rating_min is not None:
+        conditions.append(Product.rating >= filters.rating_min)
+    if filters.supplier_id is not None:
+        conditions.append(Product.supplier_id == filters.supplier_id)
+    if filters.category is not None:
+        category_ids = await category_tree.descendant_ids(filters.category)
+        if category_ids is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Category not found'
+            )
+        conditions.append(Product.category_id.in_(sorted(category_ids)))
+    return conditions
+
+
+@router.get('/')
+async def all_products(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        filters: Annotated[ProductFilter, Depends()],
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: str | None = None,
+        sort: ProductSort = 'id',
+        facets: bool = True,
+        fields: Fields = None
+):
+    """
+    Витрина товаров с фильтрами и счётчиками по фасетам.
+    Фасеты не зависят от страницы, поэтому считаются только для первой страницы.
+    """
+    fields = resolve_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    conditions = await filter_conditions(db, filters)
+    page = await product_page(db, conditions, sort, limit, cursor, fields)
+    if facets and cursor is None:
+        page['facets'] = await product_facets(db, conditions)
+    return page
 
 
 @router.post('/')
@@ -57,6 +142,7 @@ async def create_product(
             )
         )
         await db.commit()
+        await invalidate_product([], [create_product.category])
         return {
             'status_code': status.HTTP_201_CREATED,
             'transaction': 'Successful'
@@ -69,53 +155,229 @@ async def create_product(
 
 
 
-@router.get('/{category_slug}')
-async def product_by_category(
+@router.post('/bulk', status_code=status.HTTP_201_CREATED)
+async def bulk_create_products(
+        request: Request,
         db: Annotated[AsyncSession, Depends(get_db)],
-        category_slug: str
+        get_user: Annotated[dict, Depends(get_current_user)],
+        format: ImportFormat = 'ndjson'
 ):
-    category = await db.scalar(select(Category).where(Category.slug == category_slug))
-    if category is None:
+    """
+    Массовая загрузка товаров из тела запроса в формате NDJSON или CSV
+    (поля как в CreateProduct). Тело читается потоком, поэтому память
+    не зависит от размера файла. Возвращает отчёт об ошибках по номерам строк.
+    """
+    if not (get_user.get('is_supplier') or get_user.get('is_admin')):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='Category not found'
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You have not enough permission for this action'
         )
 
-    subcategories = await db.scalars(
-        select(Category.id).where(Category.parent_id == category.id)
+    bulk = BulkImport(db, get_user['id'])
+    async for number, row in iter_rows(request.stream(), format):
+        await bulk.add(number, row)
+    await bulk.flush()
+    await invalidate_product([], bulk.category_ids)
+
+    return {
+        'status_code': status.HTTP_201_CREATED,
+        'transaction': 'Successful' if not bulk.failed else 'Partially successful',
+        'created': bulk.created,
+        'failed': bulk.failed,
+        'errors': bulk.errors
+    }
+
+
+@router.post('/batch')
+async def products_batch(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        batch: ProductBatch,
+        fields: Fields = None
+):
+    """
+    Возвращает несколько товаров одним запросом (корзина, избранное) в порядке,
+    в котором они были переданы, и список тех, что не найдены.
+    """
+    fields = resolve_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    key = 'id' if batch.ids else 'slug'
+    keys = list(dict.fromkeys(batch.ids or batch.slugs))
+    column = PRODUCT_FIELDS[key]
+
+    if db.get_bind().dialect.name == 'postgresql':
+        # Один параметр-массив вместо IN (...) с переменным числом параметров:
+        # текст запроса не зависит от размера списка, и подготовленный
+        # statement переиспользуется asyncpg
+        condition = column == any_(bindparam('keys', keys, type_=ARRAY(column.type)))
+    else:
+        condition = column.in_(keys)
+
+    rows = await db.execute(
+        select(*select_columns(PRODUCT_FIELDS, fields, key)).where(condition, *LISTED)
     )
+    found = {getattr(row, key): row for row in rows}
+    return {
+        'items': [project(found[value], fields) for value in keys if value in found],
+        'missing': [value for value in keys if value not in found]
+    }
 
-    category_ids = [category.id] + subcategories.all()
 
-    products = await db.scalars(
-        select(Product).where(
-            Product.category_id.in_(category_ids),
-            Product.is_active == True,
-            Product.stock > 0
-        )
+@router.get('/export')
+async def export_catalog(format: ExportFormat = 'ndjson'):
+    """
+    Выгрузка всего каталога витрины для генераторов фидов (NDJSON или CSV).
+    Ответ пишется потоком, память не зависит от размера каталога.
+    """
+    return StreamingResponse(
+        export_products(format),
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="products.{format}"'}
     )
 
-    return products.all()
 
+@router.get('/search')
+async def search_products(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        q: Annotated[str, Query(min_length=1, max_length=200)],
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: str | None = None,
+        fields: Fields = None
+):
+    """
+    Полнотекстовый поиск по названию и описанию товара.
+    Результаты упорядочены по релевантности, каждое слово запроса ищется как префикс.
+    """
+    fields = resolve_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    terms = search_terms(q)
+    if not terms:
+        return {'items': [], 'next_cursor': None}
 
-@router.get('/detail/{product_slug}')
-async def product_detail(
-        db: Annotated[AsyncSession, Depends(get_db)],
-        product_slug: str
+    # Postgres ищет по tsvector, SQLite — по FTS5-таблице
+    match, rank, joins = search_clauses(db.get_bind().dialect.name, terms, Product.id)
+    order = ((rank, True), (Product.id, False))
+
+    query = select(*select_columns(PRODUCT_FIELDS, fields, 'id'), rank.label('rank')).select_from(Product)
+    for target, onclause in joins:
+        query = query.join(target, onclause)
+    query = query.where(*LISTED, match)
+    if cursor is not None:
+        query = query.where(keyset_filter(order, decode_cursor(cursor, order)))
+    rows = await db.execute(query.order_by(*keyset_order_by(order)).limit(limit + 1))
+
+    page = paginate(rows.all(), limit, key=lambda row: [row.rank, row.id])
+    page['items'] = [project(row, fields) for row in page['items']]
+    return page
+
+
+@router.get('/{category_slug}')
+async def product_by_category(
+        request: Request,
+        db: Annotated[AsyncSession, Depends(get_primary_read_db)],
+        category_slug: str,
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: str | None = None,
+        sort: ProductSort = 'id',
+        fields: Fields = None
 ):
-    product = await db.scalar(
-        select(Product).where(
-        Product.slug == product_slug,
-            Product.is_active == True,
-            Product.stock > 0
+    fields = resolve_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+
+    async def load():
+        category_ids = await category_tree.descendant_ids(category_slug)
+        if category_ids is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Category not found'
+            )
+        return await product_page(
+            db, [Product.category_id.in_(sorted(category_ids))], sort, limit, cursor, fields
         )
+
+    return await response_cache.respond(
+        request,
+        request_key(
+            f'product:category:{category_slug}', limit=limit, cursor=cursor, sort=sort, fields=fields
+        ),
+        ('category-tree', f'category:{category_slug}'),
+        load
     )
-    if not product:
+
+
+def parse_include(include: str | None) -> set[str]:
+    names = {name.strip() for name in (include or '').split(',') if name.strip()}
+    unknown = names - set(PRODUCT_INCLUDES)
+    if unknown:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='There is no product found'
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Unknown include: {", ".join(sorted(unknown))}'
         )
-    return product
+    return names
+
+
+@router.get('/detail/{product_slug}')
+async def product_detail(
+        request: Request,
+        db: Annotated[AsyncSession, Depends(get_primary_read_db)],
+        product_slug: str,
+        fields: Fields = None,
+        include: Annotated[str | None, Query(examples=['category,reviews,breadcrumbs'])] = None,
+        reviews_limit: Annotated[int, Query(ge=1, le=50)] = 10
+):
+    """
+    Карточка товара. Через include можно получить в том же ответе категорию,
+    последние отзывы и цепочку родительских категорий для хлебных крошек.
+    Число SQL-запросов не зависит от количества отзывов: товар с категорией
+    выбирается одним запросом с JOIN, отзывы — одним запросом с LIMIT,
+    а крошки строятся по дереву категорий в памяти.
+    """
+    fields = resolve_fields(fields, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    include = parse_include(include)
+
+    async def load():
+        columns = select_columns(PRODUCT_FIELDS, fields, 'id', 'category_id')
+        query = select(*columns).where(Product.slug == product_slug, *LISTED)
+        if 'category' in include:
+            query = query.add_columns(
+                Category.name.label('category_name'),
+                Category.slug.label('category_slug'),
+                Category.parent_id.label('category_parent_id')
+            ).outerjoin(Category, Category.id == Product.category_id)
+        product = (await db.execute(query)).first()
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='There is no product found'
+            )
+
+        document = project(product, fields)
+        if 'category' in include:
+            document['category'] = {
+                'id': product.category_id,
+                'name': product.category_name,
+                'slug': product.category_slug,
+                'parent_id': product.category_parent_id,
+            } if product.category_slug is not None else None
+        if 'reviews' in include:
+            # Первая страница отзывов; следующие — через /review/{product_id}?cursor=
+            document['reviews'] = await review_page(
+                db, [Reviews.product_id == product.id], 'newest', reviews_limit, None, list(REVIEW_FIELDS)
+            )
+        if 'breadcrumbs' in include:
+            document['breadcrumbs'] = [
+                {'id': node['id'], 'name': node['name'], 'slug': node['slug']}
+                for node in await category_tree.ancestors(product.category_id)
+            ]
+        return document
+
+    tags = [f'product:{product_slug}']
+    if include & {'category', 'breadcrumbs'}:
+        tags.append('category-tree')
+    return await response_cache.respond(
+        request,
+        request_key(
+            f'product:detail:{product_slug}', fields=fields, include=include, reviews_limit=reviews_limit
+        ),
+        tags,
+        load
+    )
 
 
 @router.put('/{product_slug}')
@@ -126,7 +388,7 @@ async def update_product(
         get_user: Annotated[dict, Depends(get_current_user)]
 ):
     if get_user.get('is_supplier') or get_user.get('is_admin'):
-        product_update = await db.scalar(select(Category).where(Product.slug == product_slug))
+        product_update = await db.scalar(select(Product).where(Product.slug == product_slug))
         if product_update is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -139,6 +401,7 @@ async def update_product(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail='There is no category found'
                 )
+            old_category_id = product_update.category_id
             product_update.name = update_product_model.name
             product_update.description = update_product_model.description
             product_update.price = update_product_model.price
@@ -148,6 +411,10 @@ async def update_product(
             product_update.slug = slugify(update_product_model.name)
 
             await db.commit()
+            await invalidate_product(
+                [product_slug, product_update.slug],
+                [old_category_id, product_update.category_id]
+            )
             return {
                 'status_code': status.HTTP_200_OK,
                 'transaction': 'Product update successful'
@@ -181,6 +448,7 @@ async def delete_product(
         if get_user.get('id') == product_delete.supplier_id or get_user.get('is_admin'):
             product_delete.is_active = False
             await db.commit()
+            await invalidate_product([product_slug], [product_delete.category_id])
             return {
                 'status_code': status.HTTP_200_OK,
                 'transaction': 'Product delete is successful'
@@ -1,31 +1,69 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Annotated
-from sqlalchemy import insert, select, update, func
+from typing import Annotated, Literal
+from sqlalchemy import insert, select, update
 
-from app.backend.db_depends import get_db
+from app.backend.db_depends import get_db, get_read_db
 from app.models.products import Product
-from app.models.reviews import Reviews
+from app.models.reviews import Reviews, ACTIVE
 from app.schemas import CreateReview
 from app.routers.auth import get_current_user
+from app.cache import invalidate_product
+from app.review_writer import review_writer
+from app.ratings import GRADES, grade_column, review_added, review_removed
+from app.fieldsets import Fields, REVIEW_FIELDS, resolve_fields, select_columns, project
+from app.pagination import decode_cursor, keyset_filter, keyset_order_by, paginate
 
 
 router = APIRouter(prefix='/review', tags=['reviews'])
 
 
+# Варианты сортировки отзывов. Каждому соответствует частичный индекс
+# в app/models/reviews.py, поэтому страница — ограниченный проход по индексу.
+ReviewSort = Literal['newest', 'highest', 'lowest']
+REVIEW_SORTS = {
+    'newest': ((Reviews.comment_date, True), (Reviews.id, False)),
+    'highest': ((Reviews.grade, True), (Reviews.comment_date, True), (Reviews.id, False)),
+    'lowest': ((Reviews.grade, False), (Reviews.comment_date, True), (Reviews.id, False)),
+}
+
+
+async def review_page(
+        db: AsyncSession,
+        conditions: list,
+        sort: ReviewSort,
+        limit: int,
+        cursor: str | None,
+        fields: list[str]
+) -> dict:
+    """
+    Возвращает страницу активных отзывов с keyset-пагинацией.
+    """
+    order = REVIEW_SORTS[sort]
+    keys = [column.key for column, _ in order]
+    query = select(*select_columns(REVIEW_FIELDS, fields, *keys)).where(ACTIVE, *conditions)
+    if cursor is not None:
+        query = query.where(keyset_filter(order, decode_cursor(cursor, order)))
+    rows = await db.execute(
+        query.order_by(*keyset_order_by(order)).limit(limit + 1)
+    )
+    page = paginate(rows.all(), limit, key=lambda row: [getattr(row, key) for key in keys])
+    page['items'] = [project(row, fields) for row in page['items']]
+    return page
+
+
 @router.get(
     '/',
-    description="Метод получения всех отзывов о товарах. Разрешен доступ всем."
+    description="Метод получения всех отзывов о товарах (сначала новые). Разрешен доступ всем."
 )
 async def all_reviews(
-        db: Annotated[AsyncSession, Depends(get_db)]):
-    reviews = await db.scalars(select(Reviews).where(Reviews.is_active.is_(True)))
-    if not reviews:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='Reviews not found'
-        )
-    return reviews.all()
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: str | None = None,
+        fields: Fields = None):
+    fields = resolve_fields(fields, REVIEW_FIELDS)
+    return await review_page(db, [], 'newest', limit, cursor, fields)
 
 
 
@@ -34,19 +72,79 @@ async def all_reviews(
     description='Метод получения отзывов об определенном товаре. Разрешен доступ всем.'
 )
 async def product_reviews(
-        db: Annotated[AsyncSession, Depends(get_db)],
+        db: Annotated[AsyncSession, Depends(get_read_db)],
+        product_id: int,
+        limit: Annotated[int, Query(ge=1, le=100)] = 20,
+        cursor: str | None = None,
+        sort: ReviewSort = 'newest',
+        fields: Fields = None
+):
+    fields = resolve_fields(fields, REVIEW_FIELDS)
+    return await review_page(db, [Reviews.product_id == product_id], sort, limit, cursor, fields)
+
+
+@router.get(
+    '/{product_id}/summary',
+    description='Метод получения распределения оценок товара. Разрешен доступ всем.'
+)
+async def product_reviews_summary(
+        db: Annotated[AsyncSession, Depends(get_read_db)],
         product_id: int
 ):
-    reviews = await db.scalars(select(Reviews).where(
-        Reviews.is_active.is_(True),
-        Reviews.product_id == product_id
+    # Гистограмма хранится в строке товара, поэтому это одно чтение по первичному ключу
+    # независимо от количества отзывов
+    product = (await db.execute(
+        select(
+            Product.review_count,
+            Product.rating,
+            *(grade_column(grade) for grade in GRADES)
+        ).where(Product.id == product_id, Product.is_active.is_(True))
+    )).first()
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='There is no product found'
+        )
+    return {
+        'total': product.review_count,
+        'average': product.rating,
+        'grades': {grade: getattr(product, grade_column(grade).key) for grade in GRADES}
+    }
+
+
+async def enqueue_review(db: AsyncSession, create_review: CreateReview, user_id: int):
+    """
+    Режим отложенной записи: проверяем товар чтением по первичному ключу,
+    ставим отзыв в очередь и отвечаем 202, не дожидаясь записи в базу.
+    """
+    product_id = await db.scalar(select(Product.id).where(
+        Product.id == create_review.product_id,
+        Product.is_active.is_(True)
     ))
-    if not reviews:
+    if product_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail='There are no reviews for the product'
+            detail='There is no product found'
+        )
+    accepted = review_writer.submit({
+        'user_id': user_id,
+        'product_id': create_review.product_id,
+        'comment': create_review.comment,
+        'grade': create_review.grade
+    })
+    if not accepted:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Too many reviews, try again later',
+            headers={'Retry-After': '1'}
         )
-    return reviews.all()
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            'status_code': status.HTTP_202_ACCEPTED,
+            'transaction': 'Accepted'
+        }
+    )
 
 
 @router.post(
@@ -64,11 +162,19 @@ async def add_review(
             detail='You have not enough permission for this action'
         )
 
-    product = await db.scalar(select(Product).where(
-        Product.is_active.is_(True),
-        Product.id == create_review.product_id
-    ))
+    if review_writer.enabled:
+        return await enqueue_review(db, create_review, get_user['id'])
+
+    # Счётчики товара обновляются одним атомарным UPDATE; заодно он проверяет,
+    # что товар существует и активен (иначе не обновится ни одна строка)
+    product = (await db.execute(
+        update(Product)
+        .where(Product.id == create_review.product_id, Product.is_active.is_(True))
+        .values(**review_added(create_review.grade))
+        .returning(Product.slug, Product.category_id)
+    )).first()
     if product is None:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There is no product found'
@@ -81,19 +187,10 @@ async def add_review(
             grade=create_review.grade
         )
     )
-    avg_rating = await db.scalar(select(func.avg(Reviews.grade)).where(
-        Reviews.product_id == create_review.product_id,
-            Reviews.is_active.is_(True)
-        )
-    )
-
-    await db.execute(
-        update(Product)
-        .where(Product.id == create_review.product_id)
-        .values(rating=round(avg_rating, 2) if avg_rating else None)
-    )
 
     await db.commit()
+    # Рейтинг товара изменился — сбрасываем его карточку и списки категорий
+    await invalidate_product([product.slug], [product.category_id])
     return {
         'status_code': status.HTTP_201_CREATED,
         'transaction': 'Successful'
@@ -114,19 +211,28 @@ async def delete_review(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You have not enough permission for this action'
         )
-    review = await db.scalar(select(Reviews).where(
-        Reviews.is_active.is_(True),
-            Reviews.id == review_id
-        )
-    )
+    # Снимаем отзыв условным UPDATE: при параллельных удалениях одного отзыва
+    # счётчики товара уменьшит только тот запрос, который действительно его деактивировал
+    review = (await db.execute(
+        update(Reviews)
+        .where(Reviews.id == review_id, Reviews.is_active.is_(True))
+        .values(is_active=False)
+        .returning(Reviews.product_id, Reviews.grade)
+    )).first()
     if review is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='There is no review found'
         )
-    else:
-        review.is_active = False
-        await db.commit()
+    product = (await db.execute(
+        update(Product)
+        .where(Product.id == review.product_id)
+        .values(**review_removed(review.grade))
+        .returning(Product.slug, Product.category_id)
+    )).first()
+    await db.commit()
+    # Изменились рейтинг и отзывы в карточке товара (include=reviews)
+    await invalidate_product([product.slug], [product.category_id])
 
     return {
         'status_code': status.HTTP_200_OK,
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, model_validator
 
 
 class CreateProduct(BaseModel):
@@ -36,5 +36,37 @@ class CreateReview(BaseModel):
     Схема создания нового отзыва.
     """
     product_id: int = Field(..., description='ID продукта для отзыва', examples=[1])
-    comment: str | None = Field(description='Текст отзыва', examples=['Соответствует описанию'])
+    comment: str | None = Field(max_length=2000, description='Текст отзыва', examples=['Соответствует описанию'])
     grade: int = Field(..., ge=1, le=5, description='Оценка отзыва (от 1 до 5 включительно)')
+
+
+class ProductFilter(BaseModel):
+    """
+    Фильтры витрины товаров (передаются в query-параметрах).
+    """
+    price_min: int | None = Field(default=None, ge=0, description='Минимальная цена', examples=[500])
+    price_max: int | None = Field(default=None, ge=0, description='Максимальная цена', examples=[5000])
+    rating_min: float | None = Field(default=None, ge=0, le=5, description='Минимальный рейтинг', examples=[4])
+    category: str | None = Field(default=None, description='Slug категории (вместе с подкатегориями)', examples=['tools'])
+    supplier_id: int | None = Field(default=None, description='ID продавца', examples=[7])
+
+
+class ProductBatch(BaseModel):
+    """
+    Схема пакетного запроса товаров: список ID или список slug (но не оба сразу).
+    """
+    ids: list[int] = Field(default_factory=list, max_length=100, description='ID товаров', examples=[[1, 2, 3]])
+    slugs: list[str] = Field(default_factory=list, max_length=100, description='Slug товаров', examples=[['drel']])
+
+    @model_validator(mode='after')
+    def check_one_kind(self):
+        if bool(self.ids) == bool(self.slugs):
+            raise ValueError('Either ids or slugs must be provided')
+        return self
+
+
+class UserIds(BaseModel):
+    """
+    Схема пакетной модерации пользователей: список ID.
+    """
+    user_ids: list[int] = Field(min_length=1, max_length=10_000, description='ID пользователей', examples=[[5, 6, 7]])
@@ -0,0 +1,77 @@
+"""
+Пересчитывает счётчики отзывов, гистограмму оценок и рейтинг всех товаров
+по таблице reviews.
+
+Нужен для первоначального заполнения и для исправления расхождений
+(например, после ручных правок в базе). Запуск:
+
+    PYTHONPATH=. python -m app.scripts.rebuild_ratings [--batch-size 1000]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select, update, func
+
+from app.backend.db import async_session_maker
+from app.models.products import Product
+from app.models.reviews import Reviews
+from app.ratings import GRADES, grade_column
+import app.models.user  # noqa: F401  (регистрирует модель для relationship)
+
+
+async def rebuild_ratings(batch_size: int) -> int:
+    """
+    Обходит товары пачками по id; на пачку — один агрегирующий запрос по reviews
+    и один пакетный UPDATE по первичному ключу. Каждая пачка — отдельная транзакция.
+    """
+    processed = 0
+    last_id = 0
+    async with async_session_maker() as db:
+        while True:
+            ids = (await db.scalars(
+                select(Product.id).where(Product.id > last_id).order_by(Product.id).limit(batch_size)
+            )).all()
+            if not ids:
+                break
+
+            stats = await db.execute(
+                select(Reviews.product_id, Reviews.grade, func.count())
+                .where(Reviews.product_id.in_(ids), Reviews.is_active.is_(True))
+                .group_by(Reviews.product_id, Reviews.grade)
+            )
+            histograms: dict[int, dict[int, int]] = {}
+            for product_id, grade, count in stats:
+                histograms.setdefault(product_id, {})[grade] = count
+
+            values = []
+            for product_id in ids:
+                histogram = histograms.get(product_id, {})
+                count = sum(histogram.values())
+                total = sum(grade * grade_count for grade, grade_count in histogram.items())
+                row = {
+                    'id': product_id,
+                    'review_count': count,
+                    'grade_sum': total,
+                    'rating': round(total / count, 2) if count else 0.0,
+                }
+                for grade in GRADES:
+                    row[grade_column(grade).key] = histogram.get(grade, 0)
+                values.append(row)
+            await db.execute(update(Product), values)
+            await db.commit()
+
+            processed += len(ids)
+            last_id = ids[-1]
+            print(f'{processed} products processed (last id {last_id})')
+    return processed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(rebuild_ratings(args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import re
+
+from sqlalchemy import func, literal_column, column, table
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# Конфигурация полнотекстового поиска Postgres. 'simple' не делает стемминга
+# и одинаково работает для русских и английских названий; частичные слова
+# находятся за счёт префиксного поиска.
+SEARCH_CONFIG = 'simple'
+
+# Выражение, по которому строится сгенерированная колонка products.search_vector.
+# Название весит больше описания (A > B), это учитывается при ранжировании.
+SEARCH_VECTOR_EXPRESSION = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+
+# Колонка не отображается в модели Product: её значение вычисляет сама база
+# при каждом INSERT/UPDATE, а приложению она нужна только в условиях поиска.
+search_vector = literal_column('products.search_vector', TSVECTOR)
+
+# В SQLite поиск идёт по FTS5-таблице products_fts (см. миграцию 8d2f6b0c4e19),
+# rowid которой совпадает с products.id
+products_fts = table('products_fts', column('rowid'))
+# Веса колонок name и description для bm25, как A и B в Postgres
+SQLITE_WEIGHTS = (10.0, 1.0)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(q: str) -> list[str]:
+    """
+    Разбивает строку запроса на слова, отбрасывая операторы tsquery и пунктуацию.
+    """
+    return _WORD.findall(q.lower())
+
+
+def build_tsquery(terms: list[str]):
+    """
+    Собирает tsquery, в котором каждое слово ищется как префикс: "дре" найдёт "дрель".
+    """
+    return func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+
+
+def search_clauses(dialect_name: str, terms: list[str], product_id) -> tuple:
+    """
+    Возвращает условие поиска, выражение релевантности (больше — лучше)
+    и соединения (таблица, условие), которые нужно добавить в запрос.
+    """
+    if dialect_name == 'sqlite':
+        fts = literal_column('products_fts')
+        # "слово"* — префиксный поиск FTS5, слова через пробел объединяются по И
+        match = fts.op('MATCH')(' '.join(f'"{term}"*' for term in terms))
+        rank = -func.bm25(fts, *SQLITE_WEIGHTS)
+        return match, rank, [(products_fts, products_fts.c.rowid == product_id)]
+
+    tsquery = build_tsquery(terms)
+    return search_vector.op('@@')(tsquery), func.ts_rank_cd(search_vector, tsquery), []
@@ -0,0 +1,139 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from fastapi import HTTPException, Request, status
+
+
+# Попыток входа на одно имя пользователя и на один IP за окно (сек.).
+# Лимит — token bucket: запас восстанавливается равномерно в течение окна.
+LOGIN_USER_ATTEMPTS = int(os.getenv('LOGIN_USER_ATTEMPTS', '5'))
+LOGIN_IP_ATTEMPTS = int(os.getenv('LOGIN_IP_ATTEMPTS', '50'))
+LOGIN_WINDOW = float(os.getenv('LOGIN_WINDOW', '60'))
+
+# Сколько ключей держит в памяти один процесс
+THROTTLE_MAX_KEYS = 100_000
+
+# Если задан — счётчики общие для всех воркеров и хранятся в Redis
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL')
+
+# Длинные имена обрезаются, чтобы ключ не мог занять много памяти
+MAX_KEY_LENGTH = 150
+
+
+class ThrottleBackend(Protocol):
+    async def take(self, key: str, capacity: int, window: float) -> float:
+        """
+        Забирает одну попытку из корзины key.
+        Возвращает 0, если попытка разрешена, иначе — сколько секунд ждать.
+        """
+        ...
+
+
+class MemoryThrottleBackend:
+    """
+    Корзины в памяти процесса. Число ключей ограничено: при переполнении
+    вытесняются давно не использованные (их корзины почти наверняка уже полные).
+    """
+
+    def __init__(self, max_keys: int = THROTTLE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: int, window: float) -> float:
+        now = time.monotonic()
+        rate = capacity / window
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RedisThrottleBackend:
+    """
+    Корзины в Redis, общие для всех воркеров. Пересчёт и списание выполняются
+    одним Lua-скриптом, поэтому параллельные попытки не обходят лимит.
+    Требует пакет redis (не входит в requirements.txt).
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local rate = capacity / window
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+    local wait = 0
+    if tokens < 1 then
+        wait = (1 - tokens) / rate
+    else
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, prefix: str = 'login-throttle:'):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.redis.register_script(self.SCRIPT)
+
+    async def take(self, key: str, capacity: int, window: float) -> float:
+        return float(await self._take(keys=[self.prefix + key], args=[capacity, window]))
+
+
+class LoginThrottle:
+    """
+    Ограничивает попытки входа по IP клиента и по имени пользователя.
+    Проверка выполняется до обращения к базе и до bcrypt, поэтому отклонённая
+    попытка почти ничего не стоит.
+    """
+
+    def __init__(
+            self,
+            backend: ThrottleBackend,
+            user_attempts: int = LOGIN_USER_ATTEMPTS,
+            ip_attempts: int = LOGIN_IP_ATTEMPTS,
+            window: float = LOGIN_WINDOW
+    ):
+        self.backend = backend
+        self.user_attempts = user_attempts
+        self.ip_attempts = ip_attempts
+        self.window = window
+        self.rejected = 0
+
+    async def check(self, request: Request, username: str) -> None:
+        # За прокси адрес клиента должен передаваться через --proxy-headers uvicorn
+        ip = request.client.host if request.client else 'unknown'
+        wait = await self.backend.take(f'ip:{ip}', self.ip_attempts, self.window)
+        if not wait:
+            wait = await self.backend.take(f'user:{username[:MAX_KEY_LENGTH]}', self.user_attempts, self.window)
+        if wait:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Too many login attempts, try again later',
+                headers={'Retry-After': str(max(1, round(wait)))}
+            )
+
+
+login_throttle = LoginThrottle(
+    RedisThrottleBackend(THROTTLE_REDIS_URL) if THROTTLE_REDIS_URL else MemoryThrottleBackend()
+)
@@ -0,0 +1,74 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+# Сколько проверенных токенов держим в памяти процесса
+TOKEN_CACHE_SIZE = 10_000
+
+
+class TokenCache:
+    """
+    LRU-кэш проверенных JWT: ключ — SHA-256 токена, значение — разобранные claims.
+
+    Повторный запрос с тем же токеном не декодирует и не проверяет подпись заново.
+    Запись живёт не дольше exp самого токена. purge_user() удаляет все токены
+    пользователя, например после изменения его прав.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[dict, int, float]] = OrderedDict()
+        self._by_user: dict[int, set[bytes]] = {}
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def _remove(self, digest: bytes) -> None:
+        claims, _, _ = self._entries.pop(digest)
+        digests = self._by_user.get(claims['id'])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[claims['id']]
+
+    def get(self, token: str) -> tuple[dict, float] | None:
+        """
+        Возвращает данные пользователя и время выдачи токена (iat).
+        """
+        digest = self._digest(token)
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expire, issued_at = entry
+        if expire <= time.time():
+            self._remove(digest)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        # Копия, чтобы обработчик не мог изменить закэшированные данные
+        return dict(claims), issued_at
+
+    def put(self, token: str, claims: dict, expire: int, issued_at: float) -> None:
+        digest = self._digest(token)
+        if digest in self._entries:
+            self._remove(digest)
+        self._entries[digest] = (dict(claims), expire, issued_at)
+        self._by_user.setdefault(claims['id'], set()).add(digest)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def purge_user(self, user_id: int) -> None:
+        for digest in list(self._by_user.get(user_id, ())):
+            self._remove(digest)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache()